@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+"""
+Runs the benchmark scenarios, each one on its own process, headless and
+with a fixed seed. Results are saved as JSON and can be compared against a
+baseline, saved by a previous run:
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -b baseline.json
+"""
+
+import getopt
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import scenarios
+
+# results format version, bump it when the layout changes
+VERSION = 1
+SEED = 2009
+# relative slowdown tolerated by the baseline comparison
+TOLERANCE = 0.1
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATADIR = os.path.join(ROOTDIR, 'data')
+CODEDIR = os.path.join(ROOTDIR, 'code')
+DEFPREFFILE = os.path.join(DATADIR, 'default_preferences.cfg')
+
+def usage():
+    """
+    Prints usage info
+    """
+    print "Usage:"
+    print "\tpython -m benchmarks.run [-h|--help] [-s|--scenario=NAME]..."
+    print "\t\t[-o|--output=FILE] [-b|--baseline=FILE] [--seed=N]"
+    print "\t\t[--tolerance=F] [--cache-dir=DIR]"
+    print
+    print "Scenarios:"
+    for scenario in scenarios.SCENARIOS:
+        print "\t%-20s%s" % (scenario.name, scenario.description)
+    print
+
+def get_peak_memory():
+    """
+    Returns the peak resident memory of the process in KB, or None if the
+    platform can't tell
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # it's in bytes on Mac OS X, KB elsewhere
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak
+
+def run_scenario(name, seed, cache_dir=None):
+    """
+    Runs a scenario on this process, returning its results. The game can
+    only be set up once per process.
+    """
+    os.chdir(DATADIR)
+    sys.path.insert(0, CODEDIR)
+    import random
+    from game import Game
+    from preferences import Preferences
+    from profiler import percentile
+    from stage import Stage
+
+    scenario = scenarios.get_scenario(name)
+    random.seed(seed)
+    # user preferences are ignored, so results don't depend on them
+    preferences = Preferences(DEFPREFFILE, DEFPREFFILE)
+    preferences.debug_profile_frames = scenario.ticks
+    game = Game(preferences, headless=True, cache_dir=cache_dir, seed=seed)
+    if scenario.stage:
+        game.loaded_stage = game.parse_stage()
+    else:
+        game.loaded_stage = Stage(None)
+
+    start = time.time()
+    ticks = game.simulate(scenario.ticks, render=True, scenario=scenario)
+    elapsed = time.time() - start
+
+    profiler = game.profiler
+    slots = profiler.get_slots()
+    phases = {}
+    for phase in profiler.get_timed():
+        values = [profiler.times[phase][i] * 1000 for i in slots]
+        phases[phase] = {"p50" : percentile(values, 50),
+                         "p99" : percentile(values, 99),
+                         "mean" : sum(values) / max(len(values), 1)}
+    peaks = {}
+    for group in profiler.names:
+        peaks[group] = max([profiler.counts[group][i] for i in slots] or [0])
+    return {"ticks" : ticks, "seconds" : elapsed,
+            "ticks_per_second" : ticks / max(elapsed, 1e-6),
+            "phases" : phases, "peak_counts" : peaks,
+            "audio_main_thread_seconds" :
+                game.music_player.get_main_thread_time(),
+            "peak_memory_kb" : get_peak_memory(),
+            "extra" : scenario.get_extra(game)}
+
+def spawn_scenario(name, seed, cache_dir=None):
+    """
+    Runs a scenario on a new process, returning its results
+    """
+    fd, result_file = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    command = [sys.executable, "-m", "benchmarks.run", "--child", name,
+               "--seed", str(seed), "--output", result_file]
+    if cache_dir:
+        command += ["--cache-dir", cache_dir]
+    try:
+        # the game output isn't part of the results
+        devnull = open(os.devnull, 'w')
+        try:
+            status = subprocess.call(command, cwd=ROOTDIR, stdout=devnull)
+        finally:
+            devnull.close()
+        if status:
+            print "Error: scenario %s failed with status %d" % (name, status)
+            return None
+        f = open(result_file)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    finally:
+        os.remove(result_file)
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Prints the throughput of each scenario against the baseline. Returns
+    the list of scenarios slower than tolerated.
+    """
+    slower = []
+    base_scenarios = baseline.get("scenarios", {})
+    for name in sorted(results["scenarios"]):
+        result = results["scenarios"][name]
+        base = base_scenarios.get(name)
+        if not result or not base:
+            print "%-20s no baseline" % name
+            continue
+        ratio = result["ticks_per_second"] / base["ticks_per_second"] - 1
+        print "%-20s %9.1f ticks/s  %+6.1f%%" % \
+            (name, result["ticks_per_second"], ratio * 100)
+        for phase in sorted(result["phases"]):
+            now = result["phases"][phase]["p50"]
+            then = base["phases"].get(phase, {}).get("p50")
+            if then:
+                print "    %-16s p50 %7.3f ms  %+6.1f%%" % \
+                    (phase, now, (now / then - 1) * 100)
+        if ratio < -tolerance:
+            slower.append(name)
+    return slower
+
+def report(results):
+    """
+    Prints a summary of the results
+    """
+    for name in sorted(results["scenarios"]):
+        result = results["scenarios"][name]
+        if not result:
+            print "%-20s failed" % name
+            continue
+        print "%-20s %9.1f ticks/s  peak memory %s KB" % \
+            (name, result["ticks_per_second"], result["peak_memory_kb"])
+        for phase in sorted(result["phases"]):
+            stats = result["phases"][phase]
+            print "    %-16s p50 %7.3f ms  p99 %7.3f ms" % \
+                (phase, stats["p50"], stats["p99"])
+
+def save(data, filename):
+    """
+    Writes data to filename as JSON
+    """
+    f = open(filename, 'w')
+    try:
+        json.dump(data, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+def main(argv):
+    """
+    Runs the scenarios given on command line, or all of them
+    """
+    try:
+        opts, args = getopt.gnu_getopt(argv[1:], "hs:o:b:",
+            ["help", "scenario=", "output=", "baseline=", "seed=",
+             "tolerance=", "cache-dir=", "child="])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    names = []
+    output = baseline = cache_dir = child = None
+    seed = SEED
+    tolerance = TOLERANCE
+    try:
+        for o, a in opts:
+            if o in ("-h", "--help"):
+                usage()
+                sys.exit(0)
+            elif o in ("-s", "--scenario"):
+                names.append(a)
+            elif o in ("-o", "--output"):
+                output = os.path.abspath(a)
+            elif o in ("-b", "--baseline"):
+                baseline = os.path.abspath(a)
+            elif o == "--seed":
+                seed = int(a)
+            elif o == "--tolerance":
+                tolerance = float(a)
+            elif o == "--cache-dir":
+                cache_dir = os.path.abspath(a)
+            elif o == "--child":
+                child = a
+    except ValueError:
+        usage()
+        sys.exit(2)
+
+    if child:
+        save(run_scenario(child, seed, cache_dir), output)
+        return
+
+    all_names = [scenario.name for scenario in scenarios.SCENARIOS]
+    for name in names:
+        if name not in all_names:
+            print "Error: unknown scenario %s" % name
+            usage()
+            sys.exit(2)
+    results = {"version" : VERSION, "seed" : seed,
+               "python" : platform.python_version(),
+               "platform" : platform.platform(), "scenarios" : {}}
+    for name in names or all_names:
+        print "Running %s..." % name
+        results["scenarios"][name] = spawn_scenario(name, seed, cache_dir)
+    report(results)
+    if output:
+        save(results, output)
+
+    if baseline:
+        f = open(baseline)
+        try:
+            base = json.load(f)
+        finally:
+            f.close()
+        print
+        print "Against %s:" % baseline
+        slower = compare(results, base, tolerance)
+        if slower:
+            print "Slower than baseline: %s" % ", ".join(slower)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+"""
+Synthetic scenarios, each one driving the game to stress a part of it.
+They are run by Game.simulate, so only game modules may be imported when
+the scenario runs, after the code dir is on the path.
+"""
+
+import math
+import random as Random
+
+# ammo that never runs out during a scenario
+UNLIMITED = 10 ** 9
+
+def weapon_attributes(name, **kw):
+    """
+    Returns the attributes of a secondary weapon, as read from a stage
+    """
+    attributes = {"name" : name, "ammo" : UNLIMITED,
+                  "max_ammo" : UNLIMITED, "cooldown" : 0, "heating" : 0,
+                  "distance" : 500, "max_charge" : 300}
+    attributes.update(kw)
+    return attributes
+
+class Scenario:
+    """
+    Base scenario, an empty stage with an invulnerable player. Subclasses
+    set up the elements to be stressed and keep them coming on each tick.
+    """
+    name = None
+    description = ""
+    ticks = 1800
+    # stage file, or None for an empty stage
+    stage = None
+
+    def setup(self, game):
+        """
+        Called once, after the game setup
+        """
+        game.player.set_pos([game.screen_size[0] / 4,
+                             game.screen_size[1] / 2])
+        # hits don't hurt, so the player survives any scenario. Life is
+        # kept as usual, the HUD draws an icon for each point.
+        game.player.life = game.player.max_life
+        game.player.do_collision = lambda: None
+
+    def tick(self, game):
+        """
+        Called before each tick
+        """
+        pass
+
+    def get_extra(self, game):
+        """
+        Returns a dict with metrics of the scenario, besides the timings
+        """
+        return {}
+
+    def spawn_enemies(self, game, count, behaviour, life=1):
+        """
+        Adds enemies until there are count of them, placed randomly on the
+        right half of the screen
+        """
+        group = game.actors_list["enemies"]
+        w, h = game.screen_size
+        for i in range(count - len(group)):
+            enemy = game.pools["enemies"].acquire([0, 0], 0, life,
+                                                  behaviour, 0,
+                                                  game.image_enemy)
+            enemy.set_pos([Random.randint(w / 2, w),
+                           Random.randint(0, h)])
+            game.add_enemy(enemy)
+
+class MultipleShotStorm(Scenario):
+    name = "multiple_shot_storm"
+    description = "MultipleShotWeapon firing all around on every tick"
+
+    def setup(self, game):
+        Scenario.setup(self, game)
+        from secondary_weapon import MultipleShotWeapon
+        weapon = MultipleShotWeapon("sw_mult", weapon_attributes(
+            "storm", radius=360, simultaneous_shoots=24))
+        game.player.sw_list = [weapon]
+        game.player.sw_selected = 0
+        game.player.set_rotation_speed(3)
+
+    def tick(self, game):
+        self.spawn_enemies(game, 30, "normal")
+        game.secondary_fire()
+
+class Horde(Scenario):
+    """
+    Hundreds of enemies of a single behaviour
+    """
+    behaviour = None
+    count = 300
+
+    def tick(self, game):
+        self.spawn_enemies(game, self.count, self.behaviour)
+
+class ZigzagHorde(Horde):
+    name = "zigzag_horde"
+    description = "300 zigzag enemies"
+    behaviour = "zigzag"
+
+class SeekerHorde(Horde):
+    name = "seeker_horde"
+    description = "300 seeker enemies"
+    behaviour = "seeker"
+
+class GuidedScreen(Scenario):
+    name = "guided_screen"
+    description = "Guided and eletric bullets locking on 100 enemies"
+    # guided bullets kept flying
+    bullets = 100
+    speed = 8
+
+    def tick(self, game):
+        # enemies hit by guided bullets die and come back
+        self.spawn_enemies(game, 100, "normal", life=3)
+        # bullets are taken from the pools as the player fires them, but
+        # without the cooldown of the weapons, so they are all in flight
+        group = game.actors_list["guided_fire"]
+        pos = game.player.get_pos()
+        for i in range(self.bullets - len(group)):
+            if (game.counter + i) % 2:
+                pool, image = game.pools["eletric_bullets"], "sw_elet"
+            else:
+                pool, image = game.pools["guided_bullets"], "sw_guided"
+            rot = Random.randint(0, 359)
+            x = self.speed * math.cos(math.radians(rot))
+            y = self.speed * math.sin(math.radians(rot))
+            pool.acquire(pos, [x, y], rotation=rot,
+                         image=game.image_player_fire[image], list=group)
+
+class Stage1(Scenario):
+    name = "stage1"
+    description = "The whole stage1.xml and a little more"
+    ticks = 2700
+    stage = "stage1.xml"
+
+class HUDTrackBox(Scenario):
+    name = "hud_trackbox"
+    description = "Track box going in and out, XP changing"
+    info = {"title" : ["Benchmark"], "artist" : ["Dead Channel"],
+            "album" : ["Scenarios"], "date" : ["2009"]}
+
+    def setup(self, game):
+        Scenario.setup(self, game)
+        game.hud.set_track_info(self.info)
+
+    def tick(self, game):
+        hud = game.hud
+        if not hud.showing_track:
+            hud.show_track_info()
+        if game.counter % 30 == 0:
+            game.player.set_xp(game.player.get_xp() + 1)
+
+    def get_extra(self, game):
+        return game.hud.get_cache_stats()
+
+SCENARIOS = [MultipleShotStorm, ZigzagHorde, SeekerHorde, GuidedScreen,
+             Stage1, HUDTrackBox]
+
+def get_scenario(name):
+    """
+    Returns a new scenario with the given name
+    """
+    for scenario in SCENARIOS:
+        if scenario.name == name:
+            return scenario()
+    raise KeyError(name)
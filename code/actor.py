@@ -10,20 +10,19 @@
 # Released under GNU GPL, read the file 'COPYING' for more information
 # ----------------------------------------------------------------------
 
-from bullet import Bullet
 from game_object import GameObject
 
 class Actor(GameObject):
     """
     Base class for all characters
     """
-    def __init__(self, position, rotation=270, life=1, speed=[0,0],
-                 rotation_speed=0, image=None):
+    def reset(self, position, rotation=270, life=1, speed=[0,0],
+              rotation_speed=0, image=None):
         """
         Set acceleration and image
         """
-        GameObject.__init__(self, image, position, rotation, speed,
-                            rotation_speed)
+        GameObject.reset(self, image, position, rotation, speed,
+                         rotation_speed)
         self.life = life
         self.set_accel([3, 3])
 
@@ -108,5 +107,5 @@ class Actor(GameObject):
         speed = list(self.get_speed())
         # double horizontal speed
         speed[0] *= 2
-        Bullet(self.get_pos(), speed, image=image, list=fire_list)
+        fire_list.spawn(self.get_pos(), speed, image)
 
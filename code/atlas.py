@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import glob
+import json
+import os
+import sys
+import pygame
+from pygame.locals import *
+
+# index format version, bump it when the index layout changes
+VERSION = 1
+INDEX_FILE = "atlas.json"
+SHEET_FILE = "atlas_%d.png"
+# max size of each sheet
+SHEET_SIZE = (1024, 1024)
+# space between sprites, so smoothed blits never bleed
+PADDING = 1
+# color of the unused sheet area, the same used as colorkey
+BACKGROUND = (255, 255, 255)
+# background images, loaded with alpha by Background
+EXCLUDE = ["321.png", "tile.png"]
+
+def list_sources(directory, exclude=EXCLUDE):
+    """
+    Returns a dict with the name of each png file of directory as keys and
+    a list with its mtime and size as values
+    """
+    sources = {}
+    for path in glob.glob(os.path.join(directory, '*.png')):
+        name = os.path.basename(path)
+        if name in exclude:
+            continue
+        st = os.stat(path)
+        sources[name] = [int(st.st_mtime), st.st_size]
+    return sources
+
+def pack(sizes, sheet_size=SHEET_SIZE, padding=PADDING):
+    """
+    Places rects of the given sizes on shelves, opening new sheets when
+    needed. sizes is a dict of name: (w, h), returns a dict of
+    name: [sheet, x, y, w, h] and the number of sheets.
+    """
+    places = {}
+    sheet = x = y = shelf_h = 0
+    # taller first, so the shelves waste less space
+    for name in sorted(sizes, key=lambda n: (-sizes[n][1], n)):
+        w, h = sizes[name]
+        if x + w > sheet_size[0]:
+            x = 0
+            y += shelf_h + padding
+            shelf_h = 0
+        if y + h > sheet_size[1]:
+            sheet += 1
+            x = y = shelf_h = 0
+        places[name] = [sheet, x, y, w, h]
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+    return places, sheet + 1
+
+def build(directory, out_dir, exclude=EXCLUDE):
+    """
+    Packs the png files of directory into sheets, saved on out_dir with an
+    index. The display must be set, as images are converted to its format.
+    """
+    sources = list_sources(directory, exclude)
+    images = {}
+    for name in sources:
+        img = pygame.image.load(os.path.join(directory, name))
+        # disable alpha as Game.load_image does
+        img.set_alpha(None)
+        images[name] = img.convert()
+    sizes = dict((name, img.get_size()) for name, img in images.items())
+    places, count = pack(sizes)
+
+    sheets = []
+    surfaces = []
+    # sheets are cropped to the area used
+    extents = [[0, 0] for i in range(count)]
+    for sheet, x, y, w, h in places.values():
+        extents[sheet][0] = max(extents[sheet][0], x + w)
+        extents[sheet][1] = max(extents[sheet][1], y + h)
+    for i in range(count):
+        surface = pygame.Surface(extents[i]).convert()
+        surface.fill(BACKGROUND)
+        surfaces.append(surface)
+        sheets.append(SHEET_FILE % i)
+    for name, (sheet, x, y, w, h) in places.items():
+        surfaces[sheet].blit(images[name], (x, y))
+    for surface, sheet in zip(surfaces, sheets):
+        pygame.image.save(surface, os.path.join(out_dir, sheet))
+
+    index = {"version" : VERSION, "sources" : sources, "sheets" : sheets,
+             "sprites" : places}
+    f = open(os.path.join(out_dir, INDEX_FILE), 'w')
+    try:
+        json.dump(index, f)
+    finally:
+        f.close()
+
+class Atlas:
+    """
+    Sprites packed in a few sheets. Each sheet is loaded once and sprites
+    are subsurfaces of it, looked up by their file name.
+    """
+    def __init__(self, directory):
+        """
+        Loads the index and the sheets saved on directory
+        """
+        f = open(os.path.join(directory, INDEX_FILE))
+        try:
+            self.index = json.load(f)
+        finally:
+            f.close()
+        self.sheets = []
+        for sheet in self.index["sheets"]:
+            path = os.path.join(directory, sheet)
+            self.sheets.append(pygame.image.load(path).convert())
+
+    def __contains__(self, name):
+        return name in self.index["sprites"]
+
+    def get(self, name):
+        """
+        Returns the sprite as a subsurface of its sheet
+        """
+        sheet, x, y, w, h = self.index["sprites"][name]
+        return self.sheets[sheet].subsurface((x, y, w, h))
+
+    def is_stale(self, directory, exclude=EXCLUDE):
+        """
+        Returns True if the sources changed since the atlas was built
+        """
+        return self.index.get("version") != VERSION or \
+               self.index["sources"] != list_sources(directory, exclude)
+
+def load_or_build(directory, out_dir, exclude=EXCLUDE):
+    """
+    Returns the atlas of the png files of directory kept on out_dir,
+    building it first if it doesn't exist or it's outdated. Returns None
+    if it can't be built.
+    """
+    try:
+        atlas = Atlas(out_dir)
+        if not atlas.is_stale(directory, exclude):
+            return atlas
+    except (IOError, ValueError, KeyError, pygame.error):
+        pass
+    try:
+        build(directory, out_dir, exclude)
+        return Atlas(out_dir)
+    except (IOError, OSError, pygame.error), e:
+        print "Warning: atlas couldn't be built: %s" % e
+        return None
+
+def main(argv):
+    """
+    Builds the atlas of a directory without starting the game
+    """
+    if len(argv) != 3:
+        print "Usage:"
+        print "\t%s GRAPHIC_DIR OUTPUT_DIR" % argv[0]
+        sys.exit(2)
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    build(argv[1], argv[2])
+
+if __name__ == '__main__':
+    main(sys.argv)
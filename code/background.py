@@ -22,98 +22,171 @@ class Image:
         self.size = self.image.get_size()
 
 class Layer:
-    def __init__(self, image, width, layer):
+    """
+    A parallax layer. Its tiles are kept in a ring buffer and blitted
+    directly to the screen, clipped to the visible area, so nothing is
+    composited again when a tile scrolls off.
+    """
+    def __init__(self, image, speed, screen_size, bottom=True):
+        """
+        Creates a layer repeating image until the screen width is covered.
+        speed is given in pixels per ms. If bottom is True the tiles are
+        aligned to the bottom of the screen, otherwise to the top.
+        """
         self.default_image = image
-        self.pos = [0, 0]
-        self.width = width
-        self.layer = layer
+        self.speed = speed
+        self.screen_size = screen_size
+        self.bottom = bottom
+        self.offset = 0.0
+        self.drawn_offset = None
         self.L = deque()
-        self.w = width * image.size[0]
-        self.h = image.size[1]
-        self.back = pygame.Surface((self.w, self.h), SRCALPHA)
+        self.fill()
 
-    def subLayer(self, screen):
-        s = screen.get_size()
-        self.pos = [0, s[1] - self.default_image.size[1]]
+    def fill(self):
+        """
+        Appends the default tile until the screen is covered even when the
+        first tile is partially scrolled off.
+        """
+        width = sum(tile.size[0] for tile in self.L)
+        while not self.L or width - self.L[0].size[0] < self.screen_size[0]:
+            self.L.append(self.default_image)
+            width += self.default_image.size[0]
 
-    def move(self):
-        self.pos[0] -= 1
+    def queue(self, image):
+        """
+        Adds a tile to the queue and makes it the default one
+        """
+        self.default_image = image
+        self.L.append(image)
 
-    def build(self):
-#        self.back = pygame.Surface((self.w, self.h), SRCALPHA)
-        # checks if the number of images is OK
-        while len(self.L) < self.width:
-            self.L.append(self.default_image)
+    def move(self, ms):
+        """
+        Scrolls the layer to the left based on the elapsed time
+        """
+        if not self.speed:
+            return
+        self.offset += self.speed * ms
+        # when the first tile is out of the screen, it leaves the ring
+        while self.offset >= self.L[0].size[0]:
+            self.offset -= self.L[0].size[0]
+            self.L.popleft()
+            self.fill()
+
+    def moved(self):
+        """
+        Returns True if the layer moved since it was last entirely drawn
+        """
+        return int(self.offset) != self.drawn_offset
 
-        lw = 0
-        self.back.blit(self.L[0].image, (0, self.default_image.size[1] - self.L[0].size[1]))
-        for i in range(1,self.width):
-            lw += self.L[i-1].size[0]
-            self.back.blit(self.L[i].image, (lw , self.h - self.L[i].size[1]))
+    def mark_drawn(self):
+        """
+        Sets the layer as entirely drawn at the current offset
+        """
+        self.drawn_offset = int(self.offset)
 
-        self.screen = self.back
+    def get_rect(self):
+        """
+        Returns the screen area covered by the layer
+        """
+        h = max(tile.size[1] for tile in self.L)
+        if self.bottom:
+            return Rect(0, self.screen_size[1] - h, self.screen_size[0], h)
+        return Rect(0, 0, self.screen_size[0], h)
 
-        # remove the first image on the queue
-        self.L.popleft()
+    def draw(self, screen, rect):
+        """
+        Draws the part of the layer inside rect
+        """
+        x = -int(self.offset)
+        for tile in self.L:
+            if x >= rect.right:
+                break
+            w, h = tile.size
+            if self.bottom:
+                y = self.screen_size[1] - h
+            else:
+                y = 0
+            area = Rect(x, y, w, h).clip(rect)
+            if area.width and area.height:
+                screen.blit(tile.image, area, area.move(-x, -y))
+            x += w
 
 
 class Background:
     """
-    It's the animated game background created with tiles.
+    It's the animated game background created with tiles. Each layer
+    scrolls with its own speed, the first one is a static backdrop.
     """
-    image = None
-    pos = None
-    L = deque()
     loaded_imgs = {}
-    ms = 0
-    size = [0, 0]
+    # speed in pixels per ms of the layer 1. Layer n scrolls n times faster.
+    layer_speed = 1 / 16.0
 
-    def __init__(self, image0, image1):
+    def __init__(self, images):
         """
-        Creates a surface with tiles repeated until cover the entire screen.
+        Creates a layer for each image of the list, in drawing order. The
+        tiles are repeated until they cover the entire screen.
         """
-
-        # to work "perfectly" all images in the tile must have the same size
-        self.layer0 = Layer(Image(self.loadImage(image0)), 1, 0)
-        self.size = self.layer0.default_image.size
         screen = pygame.display.get_surface()
-        screen_size = screen.get_size()
+        self.screen_size = screen.get_size()
+        self.layers = []
+        for image in images:
+            self.add_layer(image)
+        self.size = self.layers[0].default_image.size
 
-        image = self.loadImage(image1)
-        size = image.get_size()         
-        self.layer1 = Layer(Image(image), screen_size[0] / size[0] + 1, 1)
-        self.layer1.subLayer(screen)
-
-        self.layer0.build()
-        self.layer1.build()
+    def add_layer(self, image):
+        """
+        Adds a layer of image tiles on top of the others
+        """
+        n = len(self.layers)
+        layer = Layer(Image(self.loadImage(image)), n * self.layer_speed,
+                      self.screen_size, bottom=n > 0)
+        self.layers.append(layer)
+        return layer
 
     def nextTile(self, next, layer):
         """
-        Adds a tile to the queue and makes it default
+        Adds a tile to the queue of a layer and makes it default. Layers not
+        created yet are added on top.
         """
-        self.layer1.default_image = Image(self.loadImage(next))
-        self.layer1.L.append(self.layer1.default_image)
-        #The tile added becomes the new default tile
+        while layer >= len(self.layers):
+            self.add_layer(next)
+        self.layers[layer].queue(Image(self.loadImage(next)))
 
     def update(self, ms):
         """
-        Moves the background to the left
+        Moves the layers to the left
         """
-        self.ms += ms
-        if self.ms > 10:
-            self.ms = 0
-            self.layer1.move()
-            # when it reaches the end, moves the background for the start point
-            if (self.layer1.pos[0] <= -self.layer1.default_image.size[0]):
-                self.layer1.pos[0] += self.layer1.default_image.size[0]
-                self.layer1.build()
+        for layer in self.layers:
+            layer.move(ms)
 
-    def draw(self,screen):
+    def draw(self, screen):
         """
         Draws the background
         """
-        screen.blit(self.layer0.screen, (0,0))
-        screen.blit(self.layer1.screen, (self.layer1.pos))
+        self.clear(screen, screen.get_rect())
+        for layer in self.layers:
+            layer.mark_drawn()
+
+    def clear(self, screen, rect):
+        """
+        Draws only the background area under rect. It has the same
+        signature of the callback taken by sprite groups clear method.
+        """
+        for layer in self.layers:
+            layer.draw(screen, rect)
+
+    def draw_dirty(self, screen):
+        """
+        Draws the regions of the layers that moved since last draw.
+        Returns a list with the changed rects.
+        """
+        moved = [layer for layer in self.layers if layer.moved()]
+        rects = [layer.get_rect() for layer in moved]
+        for rect in rects:
+            self.clear(screen, rect)
+        for layer in moved:
+            layer.mark_drawn()
+        return rects
 
     def loadImage(self, image_path):
         """
@@ -131,4 +204,3 @@ class Background:
             # image is saved in memory, for no file reading
             self.loaded_imgs[image_path] = image
         return image
-
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import numpy
+
+# movements available on every stage. speed is the initial speed, zigzag
+# flips the vertical speed every that many ticks and seek moves that many
+# pixels towards the player height every other tick, instead of the
+# vertical speed. Stages can define others.
+BEHAVIOURS = {
+    "normal" : {"speed" : [-4, 0]},
+    "fast" : {"speed" : [-7, 0]},
+    "diagonal" : {"speed" : [-3, 1]},
+    "seeker" : {"speed" : [-3, 1], "seek" : 1},
+    "zigzag" : {"speed" : [-3, -8], "zigzag" : 15},
+    "zigzaglong" : {"speed" : [-3, -8], "zigzag" : 30},
+}
+DEFAULT_BEHAVIOUR = "normal"
+# initial number of enemies each behaviour can hold, it grows when needed
+INITIAL_CAPACITY = 64
+
+class Behaviour:
+    """
+    A movement rule and the enemies following it. The tick each enemy was
+    added is kept on an array, so the speeds of all of them are computed
+    with a few vector operations.
+    """
+    def __init__(self, name, speed, zigzag=0, seek=0):
+        self.name = name
+        self.members = []
+        self.births = numpy.zeros(INITIAL_CAPACITY, numpy.int64)
+        self.define(speed, zigzag, seek)
+
+    def define(self, speed, zigzag=0, seek=0):
+        """
+        Sets the rule, enemies already following it follow the new one
+        """
+        self.speed = list(speed)
+        self.zigzag = zigzag
+        self.seek = seek
+        for enemy in self.members:
+            enemy.speed = list(speed)
+
+    def add(self, enemy, tick):
+        """
+        Makes enemy follow the rule from tick on
+        """
+        n = len(self.members)
+        if n == len(self.births):
+            self.births = numpy.resize(self.births, n * 2)
+        self.births[n] = tick
+        enemy.behaviour_rule = self
+        enemy.behaviour_slot = n
+        self.members.append(enemy)
+
+    def remove(self, enemy):
+        """
+        Removes enemy, moving the last one to its slot
+        """
+        slot = enemy.behaviour_slot
+        last = self.members.pop()
+        n = len(self.members)
+        if slot != n:
+            self.members[slot] = last
+            self.births[slot] = self.births[n]
+            last.behaviour_slot = slot
+        enemy.behaviour_rule = None
+
+    def update(self, tick, player_y):
+        """
+        Sets the speed of every enemy for tick
+        """
+        n = len(self.members)
+        if n == 0 or not (self.zigzag or self.seek):
+            # the speed set when the enemies were created doesn't change
+            return
+        # ticks since each enemy was added, starting at 1
+        counter = tick - self.births[:n]
+        speed = numpy.empty((n, 2), int)
+        speed[:, 0] = self.speed[0]
+        speed[:, 1] = self.speed[1]
+        if self.zigzag:
+            flipped = (counter // self.zigzag) % 2 == 1
+            speed[flipped, 1] = -self.speed[1]
+        if self.seek:
+            y = numpy.array([enemy.rect.centery for enemy in self.members])
+            seek = numpy.sign(player_y - y) * self.seek
+            speed[:, 1] = numpy.where(counter % 2 == 0, seek, 0)
+        for enemy, enemy_speed in zip(self.members, speed.tolist()):
+            enemy.speed = enemy_speed
+
+class BehaviourEngine:
+    """
+    Moves the enemies by behaviour, each behaviour updating all of its
+    enemies at once, instead of each enemy checking its behaviour on every
+    update.
+    """
+    def __init__(self, definitions=BEHAVIOURS):
+        self.behaviours = {}
+        # names used but not defined
+        self.unknown = set()
+        for name, attributes in definitions.items():
+            self.define(name, **attributes)
+
+    def define(self, name, speed, zigzag=0, seek=0):
+        """
+        Adds a behaviour, or changes an existing one
+        """
+        behaviour = self.behaviours.get(name)
+        if behaviour is None:
+            self.behaviours[name] = Behaviour(name, speed, zigzag, seek)
+        else:
+            behaviour.define(speed, zigzag, seek)
+
+    def get(self, name):
+        """
+        Returns the behaviour called name, or the default one if there's
+        no such behaviour
+        """
+        behaviour = self.behaviours.get(name)
+        if behaviour is None:
+            if name not in self.unknown:
+                print "Warning: unknown behaviour %s" % name
+                self.unknown.add(name)
+            behaviour = self.behaviours[DEFAULT_BEHAVIOUR]
+        return behaviour
+
+    def get_speed(self, name):
+        """
+        Returns a list with the initial speed of behaviour name
+        """
+        return list(self.get(name).speed)
+
+    def add(self, enemy, tick):
+        """
+        Makes enemy move by its behaviour, from tick on
+        """
+        self.get(enemy.behaviour).add(enemy, tick)
+
+    def remove(self, enemy):
+        """
+        Stops moving enemy, if it was added
+        """
+        if enemy.behaviour_rule is not None:
+            enemy.behaviour_rule.remove(enemy)
+
+    def update(self, tick, player_y):
+        """
+        Sets the speed of every enemy for tick
+        """
+        for behaviour in self.behaviours.values():
+            behaviour.update(tick, player_y)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+from operator import attrgetter
+import pygame
+from pygame.locals import *
+
+# input modes, as set on preferences
+INPUT_MODES = ["mouse", "keyboard", "joystick_analogic", "joystick_d-pad"]
+# functions returning the code of each event type bound. Other events have
+# no code, so they are bound by type only.
+EVENT_CODES = {
+    KEYDOWN : attrgetter('key'),
+    KEYUP : attrgetter('key'),
+    MOUSEBUTTONDOWN : attrgetter('button'),
+    MOUSEBUTTONUP : attrgetter('button'),
+    JOYBUTTONDOWN : attrgetter('joy', 'button'),
+    JOYBUTTONUP : attrgetter('joy', 'button'),
+    JOYAXISMOTION : attrgetter('joy', 'axis'),
+    JOYHATMOTION : attrgetter('joy'),
+}
+# mouse motions of that many pixels or more, on an axis, are ignored
+MOUSE_JUMP = 100
+
+def get_code(event):
+    """
+    Returns the code of event, as the key pressed, or None
+    """
+    code = EVENT_CODES.get(event.type)
+    if code is None:
+        return None
+    return code(event)
+
+def coalesce(events):
+    """
+    Returns events with the motion events merged, so a frame handles a
+    single one of each: mouse motions have their relative movements added,
+    but the ones of MOUSE_JUMP or more, and only the last value of each
+    joystick axis and hat is kept. Other events keep their order, merged
+    ones come after them.
+    """
+    result = []
+    rel_x = rel_y = 0
+    mouse = None
+    last = {}
+    for event in events:
+        type = event.type
+        if type == MOUSEMOTION:
+            mouse = event
+            #FIXME HACK: the first rel is a huge number, the
+            # difference between 0, 0 and the curson position.
+            # So it needs to be avoided, before adding the others.
+            # This hack should be removed after we include
+            # screens before the game screen
+            if event.rel[0] < MOUSE_JUMP and event.rel[1] < MOUSE_JUMP:
+                rel_x += event.rel[0]
+                rel_y += event.rel[1]
+        elif type == JOYAXISMOTION or type == JOYHATMOTION:
+            code = get_code(event)
+            if (type, code) not in last:
+                # keeps the order the axes moved first
+                result.append(None)
+                last[(type, code)] = len(result) - 1
+            result[last[(type, code)]] = event
+        else:
+            result.append(event)
+    if last:
+        result = [event for event in result if event is not None]
+    if mouse is not None:
+        result.append(pygame.event.Event(MOUSEMOTION, pos=mouse.pos,
+                                         rel=(rel_x, rel_y),
+                                         buttons=mouse.buttons))
+    return result
+
+class Bindings:
+    """
+    Table of the actions bound to each input, keyed by input mode, event
+    type and code, so an event is dispatched by a single lookup instead of
+    comparing it against every preference.
+    """
+    def __init__(self):
+        self.table = {}
+
+    def bind(self, modes, type, code, action):
+        """
+        Binds action to the event of type and code on each of modes. Actions
+        are called with the event. An input may have many actions, called
+        in the order they were bound.
+        """
+        for mode in modes:
+            self.table.setdefault((mode, type, code), []).append(action)
+
+    def dispatch(self, mode, event):
+        """
+        Calls the actions bound to event on mode, if any
+        """
+        actions = self.table.get((mode, event.type, get_code(event)))
+        if actions:
+            for action in actions:
+                action(event)
+
+    def get_types(self, mode):
+        """
+        Returns the list of event types bound on mode
+        """
+        types = set()
+        for bound_mode, type, code in self.table:
+            if bound_mode == mode:
+                types.add(type)
+        return list(types)
+
+    def set_allowed(self, mode, *types):
+        """
+        Lets only the events bound on mode, and the given types, into the
+        event queue
+        """
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(self.get_types(mode) + list(types))
@@ -11,17 +11,17 @@
 # ----------------------------------------------------------------------
 
 import math
-import sys
 from game_object import GameObject
 
 class Bullet(GameObject):
     """
-    Class for bullets.
+    Class for bullets that need a behaviour of their own, as guided ones.
+    Regular bullets are kept by BulletStore.
     """
-    def __init__(self, position, speed=None, rotation=0, rotation_speed=0,
-                 image=None, list=None, distance = -1):
-        GameObject.__init__(self, image, position, rotation, speed,
-                            rotation_speed)
+    def reset(self, position, speed=None, rotation=0, rotation_speed=0,
+              image=None, list=None, distance = -1):
+        GameObject.reset(self, image, position, rotation, speed,
+                         rotation_speed)
         self.distance = 0
         self.max_distance = distance
         if list != None:
@@ -44,99 +44,33 @@ class Bullet(GameObject):
         self.kill()
 
 
-class FragmentaryBullet(Bullet):
-    def __init__(self, position, speed=None, rotation=0, rotation_speed=0,
-                 image=None, list=None, distance = -1, fragments = 2):
-        Bullet.__init__(self, position, speed=speed, rotation=rotation,
-                        rotation_speed=rotation_speed, image=image,
-                        list=list, distance=distance)
-        self.fragments = fragments
-        self.list = list
-
-    def at_max_distance(self):
-        for frag in range(self.fragments):
-            speed = 8
-            angle_dt = 360 / self.fragments
-            frag_angle = frag * angle_dt
-            x = speed * math.cos(math.radians(frag_angle))
-            y = speed * math.sin(math.radians(frag_angle))
-            Bullet(self.get_pos(), [x, y], image = self.image, list = self.list)
-        self.kill()
-
 class GuidedBullet(Bullet):
-    def __init__(self, position, speed=None, rotation=0, rotation_speed=0,
-                 image=None, list=None, distance = -1, enemy_list = None):
-        Bullet.__init__(self, position, speed=speed, rotation=rotation,
-                        rotation_speed=rotation_speed, image=image,
-                        list=list, distance=distance)
-        self.enemy_list = enemy_list
-        self.prev_targets = []
-        self.target = self.lock_target()
-
-    def update(self, dt, ms, *args):
-        """
-        Set speed before calling Bullet update method.
-        Speed will be set to keep the bullet following the target.
-        """
-        # if it's not locked, try to lock to a new target
-        if self.target == None or self.target.is_dead():
-            self.target = self.lock_target()
-            # if any target was found, just act a regular bullet
-            if self.target == None:
-                Bullet.update(self, dt, ms)
-                return
-        s = 10
-        d = self.get_enemy_distance(self.target)
-        if d[0] == 0:
-            sx = 0
-            sy = s
-        else:
-            sx = math.sqrt(s**2 * (((float(d[1])/d[0])**2 + 1) ** (-1)))
-            if d[0] < 0:
-                sx = -sx
-            sy = float(d[1])/d[0] * sx
-        self.set_speed([sx, sy])
-        Bullet.update(self, dt, ms)
-
-    def lock_target(self):
-        """
-        Lock the nearest target
-        """
-        target = None
-        min_distance = sys.maxint
-        for enemy in self.enemy_list:
-            if enemy in self.prev_targets:
-                continue
-            distance = self.get_enemy_distance(enemy)
-            distance = abs(distance[0]) + abs(distance[1])
-            if distance < min_distance:
-                min_distance = distance
-                target = enemy
-        self.prev_targets.append(target)
-        return target
-
-    def get_enemy_distance(self, enemy):
-        """
-        Get distance vector to enemy
-        """
-        pos = self.get_pos()
-        t_pos = enemy.get_pos()
-        d = [t_pos[0] - pos[0], t_pos[1] - pos[1]]
-        return d
+    """
+    Bullet that follows an enemy. Targets are locked and the speed is set
+    by the Targeting service, once per tick for all guided bullets.
+    """
+    def reset(self, position, speed=None, rotation=0, rotation_speed=0,
+              image=None, list=None, distance = -1):
+        Bullet.reset(self, position, speed=speed, rotation=rotation,
+                     rotation_speed=rotation_speed, image=image,
+                     list=list, distance=distance)
+        # enemies followed, with their generation, a bullet never locks on
+        # the same one again
+        self.prev_targets = set()
+        self.target = None
 
 class EletricBullet(GuidedBullet):
     hits = 0
     max_hits = 2
-#    def __init__(self, position, speed=None, rotation=0, rotation_speed=0,
-#                 image=None, list=None, distance = -1, enemy_list = None):
-#
-#        GuidedBullet.__init__(self, position, speed, rotation, rotation_speed,
-#                              image, list, distance, enemy_list)
-#        self.hits = 0
-#        self.max_hits = 2
+    def reset(self, position, speed=None, rotation=0, rotation_speed=0,
+              image=None, list=None, distance = -1):
+        GuidedBullet.reset(self, position, speed, rotation, rotation_speed,
+                           image, list, distance)
+        self.hits = 0
 
     def do_collision(self):
         self.hits += 1
-        self.lock_target()
+        # goes to another target on next tick
+        self.target = None
         if self.hits == self.max_hits:
             self.kill()
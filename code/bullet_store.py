@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import math
+import numpy
+import pygame
+from rotation import RotationCache
+
+# initial number of bullets the arrays can hold, they grow when needed
+INITIAL_CAPACITY = 256
+# speed of the fragments created when a fragmentary bullet explodes
+FRAGMENT_SPEED = 8
+
+class BulletStore:
+    """
+    Keeps all the bullets of a side (player or enemies) as arrays instead of
+    sprites, so they are moved, culled and expired with a few vectorized
+    operations per tick.
+    It can be placed in Game.actors_list as it provides update() and draw()
+    the same way sprite groups do.
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """
+        Creates an empty store
+        """
+        self.n = 0
+        # registered images and their index. sources keeps the image each
+        # one was taken from, that may be a RotationCache.
+        self.images = []
+        self.sources = []
+        self.image_index = {}
+        self.image_w = numpy.zeros(0, numpy.int32)
+        self.image_h = numpy.zeros(0, numpy.int32)
+        self.allocate(capacity)
+        # fraction of the way from the previous positions drawn
+        self.alpha = 1.0
+        # rects of the last draw, used to erase the bullets
+        self.drawn = []
+        screen = pygame.display.get_surface()
+        self.area = screen.get_rect()
+
+    def __len__(self):
+        """
+        Returns the number of live bullets
+        """
+        return self.n
+
+    def allocate(self, capacity):
+        """
+        Resize the arrays to hold capacity bullets, keeping the live ones
+        """
+        n = self.n
+        pos = numpy.zeros((capacity, 2), numpy.float64)
+        prev_pos = numpy.zeros((capacity, 2), numpy.float64)
+        speed = numpy.zeros((capacity, 2), numpy.float64)
+        distance = numpy.zeros(capacity, numpy.float64)
+        max_distance = numpy.zeros(capacity, numpy.float64)
+        image = numpy.zeros(capacity, numpy.int32)
+        fragments = numpy.zeros(capacity, numpy.int32)
+        if n:
+            pos[:n] = self.pos[:n]
+            prev_pos[:n] = self.prev_pos[:n]
+            speed[:n] = self.speed[:n]
+            distance[:n] = self.distance[:n]
+            max_distance[:n] = self.max_distance[:n]
+            image[:n] = self.image[:n]
+            fragments[:n] = self.fragments[:n]
+        self.pos = pos
+        # positions before the last update, to draw between both
+        self.prev_pos = prev_pos
+        self.speed = speed
+        self.distance = distance
+        self.max_distance = max_distance
+        self.image = image
+        self.fragments = fragments
+        self.capacity = capacity
+
+    def get_image_id(self, image, source=None):
+        """
+        Returns the index of image, registering it if needed
+        """
+        index = self.image_index.get(image)
+        if index is None:
+            index = len(self.images)
+            self.images.append(image)
+            self.sources.append(source or image)
+            self.image_index[image] = index
+            w, h = image.get_size()
+            self.image_w = numpy.append(self.image_w, w)
+            self.image_h = numpy.append(self.image_h, h)
+        return index
+
+    def spawn(self, position, speed, image, distance=-1, fragments=0):
+        """
+        Adds a bullet. If distance isn't -1, the bullet expires after
+        travelling it, splitting in the given number of fragments.
+        If image is a RotationCache, the frame pointing to the bullet
+        direction is used.
+        """
+        source = image
+        if isinstance(image, RotationCache):
+            image = image.get(math.degrees(math.atan2(speed[1], speed[0])))
+        if self.n == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.n
+        self.pos[i] = position
+        self.prev_pos[i] = position
+        self.speed[i] = speed
+        self.distance[i] = 0
+        self.max_distance[i] = distance
+        self.image[i] = self.get_image_id(image, source)
+        self.fragments[i] = fragments
+        self.n += 1
+
+    def compact(self, keep):
+        """
+        Removes the bullets not flagged by the boolean array keep
+        """
+        n = self.n
+        k = int(keep.sum())
+        if k == n:
+            return
+        for arr in (self.pos, self.prev_pos, self.speed, self.distance,
+                    self.max_distance, self.image, self.fragments):
+            arr[:k] = arr[:n][keep]
+        self.n = k
+
+    def kill(self, indices):
+        """
+        Removes the bullets with the given indices
+        """
+        if not len(indices):
+            return
+        keep = numpy.ones(self.n, bool)
+        keep[list(indices)] = False
+        self.compact(keep)
+
+    def get_rects(self, pos=None):
+        """
+        Returns arrays with left, top, right and bottom of the live bullets,
+        as the rect of a sprite centered at the bullet position, or at the
+        given array of positions.
+        """
+        n = self.n
+        if pos is None:
+            pos = self.pos[:n]
+        image = self.image[:n]
+        w = self.image_w[image]
+        h = self.image_h[image]
+        left = numpy.floor(pos[:, 0]).astype(numpy.int32) - w // 2
+        top = numpy.floor(pos[:, 1]).astype(numpy.int32) - h // 2
+        return left, top, left + w, top + h
+
+    def get_rect(self, i):
+        """
+        Returns the rect of bullet i
+        """
+        w = int(self.image_w[self.image[i]])
+        h = int(self.image_h[self.image[i]])
+        x, y = numpy.floor(self.pos[i]).astype(numpy.int32).tolist()
+        return pygame.Rect(x - w // 2, y - h // 2, w, h)
+
+    def get_image(self, i):
+        """
+        Returns the image of bullet i
+        """
+        return self.images[self.image[i]]
+
+    def interpolate(self, alpha):
+        """
+        Makes the next draw place the bullets alpha of the way from their
+        previous positions to the current ones
+        """
+        self.alpha = alpha
+
+    def update(self, dt, ms, *args):
+        """
+        Moves all bullets, removes the ones out of the screen and expires the
+        ones which reached their max distance.
+        """
+        n = self.n
+        if n == 0:
+            return
+        step = self.speed[:n] * (dt / 16.0)
+        self.prev_pos[:n] = self.pos[:n]
+        self.pos[:n] += step
+        limited = self.max_distance[:n] != -1
+        self.distance[:n] += numpy.where(limited,
+            numpy.hypot(step[:, 0], step[:, 1]), 0)
+
+        left, top, right, bottom = self.get_rects()
+        area = self.area
+        keep = (right >= area.left) & (left <= area.right) & \
+               (bottom >= area.top) & (top <= area.bottom)
+        expired = keep & limited & \
+            (self.distance[:n] >= self.max_distance[:n])
+        # fragmentary bullets split before being removed. They are few, so
+        # a plain loop is fine.
+        fragments = []
+        for i in numpy.flatnonzero(expired & (self.fragments[:n] > 0)):
+            fragments.append((tuple(self.pos[i]), self.sources[self.image[i]],
+                              int(self.fragments[i])))
+        self.compact(keep & ~expired)
+        for pos, image, count in fragments:
+            angle_dt = 360 / count
+            for frag in range(count):
+                frag_angle = math.radians(frag * angle_dt)
+                speed = [FRAGMENT_SPEED * math.cos(frag_angle),
+                         FRAGMENT_SPEED * math.sin(frag_angle)]
+                self.spawn(pos, speed, image)
+
+    def collide_rect(self, rect, collided=None):
+        """
+        Returns an array with the indices of the bullets colliding with rect.
+        If collided is given, it's called with the rect and image of each
+        bullet whose rect collides, and only the ones it returns True for
+        are hits.
+        """
+        left, top, right, bottom = self.get_rects()
+        hit = (left < rect.right) & (right > rect.left) & \
+              (top < rect.bottom) & (bottom > rect.top)
+        indices = numpy.flatnonzero(hit)
+        if collided is None or not len(indices):
+            return indices
+        return numpy.array([i for i in indices.tolist()
+                            if collided(self.get_rect(i), self.get_image(i))],
+                           numpy.intp)
+
+    def groupcollide(self, group, collided=None):
+        """
+        Works like pygame.sprite.groupcollide, returning a dict with the
+        index of each bullet that hitted sprites of group as keys and a
+        list of these sprites as values. If collided is given, it's called
+        with the rect and image of the bullet and the sprite when their
+        rects collide, and only the ones it returns True for are hits.
+        """
+        hitted = {}
+        if self.n == 0:
+            return hitted
+        for sprite in group.sprites():
+            test = None
+            if collided is not None:
+                test = lambda rect, image: collided(rect, image, sprite)
+            for i in self.collide_rect(sprite.rect, test):
+                hitted.setdefault(int(i), []).append(sprite)
+        return hitted
+
+    def draw(self, surface):
+        """
+        Draws all bullets in a single batch. Returns the changed rects,
+        where bullets were and are now, as RenderUpdates does.
+        """
+        dirty = self.drawn
+        n = self.n
+        if n == 0:
+            self.drawn = []
+            return dirty
+        pos = None
+        if self.alpha < 1.0:
+            prev = self.prev_pos[:n]
+            pos = prev + (self.pos[:n] - prev) * self.alpha
+        left, top, right, bottom = self.get_rects(pos)
+        images = self.images
+        batch = [(images[i], (x, y)) for i, x, y in
+                 zip(self.image[:n].tolist(), left.tolist(), top.tolist())]
+        if hasattr(surface, "blits"):
+            self.drawn = surface.blits(batch)
+        else:
+            self.drawn = [surface.blit(image, pos) for image, pos in batch]
+        return dirty + self.drawn
+
+    def clear(self, surface, bgd):
+        """
+        Erase the bullets drawn on last frame, calling bgd(surface, rect)
+        for each of them, as sprite groups do.
+        """
+        for rect in self.drawn:
+            bgd(surface, rect)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+# size in pixels of each (square) cell of the grid
+CELL_SIZE = 64
+
+class SpatialGrid:
+    """
+    Uniform grid used as collision broadphase. Sprites are bucketed by the
+    screen-space cells their rects overlap, so a collision query only tests
+    the sprites sharing a cell with the queried rect, instead of every
+    sprite of the group.
+    Cells are kept in a dict, so sprites out of the screen are handled too.
+    """
+    def __init__(self, cell_size=CELL_SIZE):
+        """
+        Creates an empty grid
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        """
+        Remove all sprites from the grid
+        """
+        self.cells = {}
+
+    def cell_range(self, rect):
+        """
+        Returns the first and last cells overlapped by rect
+        """
+        cs = self.cell_size
+        return (rect.left // cs, rect.top // cs,
+                (rect.right - 1) // cs, (rect.bottom - 1) // cs)
+
+    def build(self, groups):
+        """
+        Bucket all the sprites of the given groups. groups is a dict of
+        sprite groups, as Game.actors_list.
+        """
+        self.cells = {}
+        for name, group in groups.items():
+            cells = {}
+            # the index is kept to return the hits in the group order
+            for index, sprite in enumerate(group.sprites()):
+                x0, y0, x1, y1 = self.cell_range(sprite.rect)
+                for cx in xrange(x0, x1 + 1):
+                    for cy in xrange(y0, y1 + 1):
+                        cell = cells.get((cx, cy))
+                        if cell is None:
+                            cell = cells[(cx, cy)] = []
+                        cell.append((index, sprite))
+            self.cells[name] = cells
+
+    def query(self, rect, name):
+        """
+        Returns a list with the sprites of group name still alive whose
+        rects collide with rect, in the same order spritecollide would.
+        """
+        cells = self.cells.get(name)
+        if not cells:
+            return []
+        found = {}
+        x0, y0, x1, y1 = self.cell_range(rect)
+        for cx in xrange(x0, x1 + 1):
+            for cy in xrange(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for index, sprite in cell:
+                    if index in found:
+                        continue
+                    # sprites may be killed by previous checks on this tick
+                    if sprite.alive() and rect.colliderect(sprite.rect):
+                        found[index] = sprite
+        return [found[index] for index in sorted(found)]
@@ -11,6 +11,11 @@
 # ----------------------------------------------------------------------
 
 from actor import Actor
+from behaviour import BEHAVIOURS
+
+# mean time between shots of an enemy, and how much it may change, in ms
+FIRE_PERIOD = 880
+FIRE_JITTER = 560
 
 class Callable:
     """
@@ -23,65 +28,54 @@ class Enemy(Actor):
     """
     Class for enemy characters
     """
-    def __init__(self, position, rotation=180, life=1, behaviour="normal", rotation_speed=0,
-                 image=None):
+    # BehaviourEngine setting the speed of the enemies, set by the game
+    engine = None
+    # behaviour the enemy follows on the engine, and its slot there
+    behaviour_rule = None
+    behaviour_slot = None
+    # timer firing the enemy bullets
+    fire_timer = None
+    # enemies spawned so far, each spawn gets the next number as generation,
+    # so a pooled enemy spawned again isn't taken by the one killed
+    spawned = 0
+
+    def reset(self, position, rotation=180, life=1, behaviour="normal",
+              rotation_speed=0, image=None):
         """
-        Creates an enemy character that could has one of the following
-        behaves: normal, fast, or diagonal.
+        Creates an enemy character that could has one of the behaviours of
+        the engine, as normal, fast, or diagonal. It starts moving by its
+        behaviour when added to the engine.
         """
-        
-        self.speed_list =  {"normal":[-4,0], 
-                            "fast":[-7,0], 
-                            "diagonal":[-3,1], 
-                            "seeker":[-3,1], 
-                            "zigzag":[-3,-8],
-                            "zigzaglong":[-3,-8]
-                            }
-
-        self.counter = 1
-        self.orientation = True
+        Enemy.spawned += 1
+        self.generation = Enemy.spawned
         self.behaviour = behaviour
-        speed = self.speed_list[behaviour]
+        speed = self.engine.get_speed(behaviour)
+
+        Actor.reset(self, position, rotation, life, speed,
+                    rotation_speed, image)
 
-        Actor.__init__(self, position, rotation, life, speed,
-                       rotation_speed, image)
+    def schedule_fire(self, scheduler, fire_list, image):
+        """
+        Fires on fire_list every FIRE_PERIOD ms or so, while alive
+        """
+        self.fire_timer = scheduler.repeat(FIRE_PERIOD, FIRE_JITTER,
+                                           self.fire, fire_list, image)
 
-    def update(self, dt, ms, counter, x, y):
-        if self.behaviour == "zigzag":
-            if self.counter % 15 == 0:
-                if self.orientation == False:
-                    self.speed = [-3, -8]
-                    self.orientation = True
-                else:
-                    self.speed = [-3, 8]
-                    self.orientation = False
-        if self.behaviour == "zigzaglong":
-            if self.counter % 30 == 0:
-                if self.orientation == False:
-                    self.speed = [-3, -8]
-                    self.orientation = True
-                else:
-                    self.speed = [-3, 8]
-                    self.orientation = False
-        elif self.behaviour == "seeker":
-            if self.counter %2 == 0:
-                if self.orientation == True:
-                    e_x, e_y = self.get_pos()
-                    if e_y > y:
-                        self.speed = [-3, -1]
-                    elif e_y < y:
-                        self.speed = [-3, 1]
-                    else:
-                        self.speed = [-3, 0]
-            else:
-                self.speed = [-3, 0]
-        self.counter = self.counter + 1
-        Actor.update(self, dt, ms)
+    def kill(self):
+        """
+        Stops following the behaviour and firing, and removes the enemy
+        """
+        if self.engine is not None:
+            self.engine.remove(self)
+        if self.fire_timer is not None:
+            self.fire_timer.cancel()
+            self.fire_timer = None
+        Actor.kill(self)
 
     def get_behaviours():
         """
         Returns a list with all the possible behaviours
         """
-        return ["normal", "fast", "diagonal"]
+        return sorted(BEHAVIOURS)
     get_behaviours = Callable(get_behaviours)
 
@@ -11,8 +11,9 @@
 # ----------------------------------------------------------------------
 
 import os
+import time
 # random will be useful for lots of things, as position where enemies will be
-# placed
+# placed. The game has a generator of its own, so it can be seeded.
 import random as Random
 # imports all the available pygame modules
 import pygame
@@ -24,9 +25,40 @@ from background import Background
 from player import Player
 from enemy import Enemy
 from hud import HUD
-from stage import Stage
+from stage import open_stage
 from music import Music_player
+import music
 from power_up import PowerUp
+from collision import SpatialGrid
+from targeting import Targeting
+from behaviour import BehaviourEngine
+from scheduler import Scheduler
+from shapes import make_shapes, collide
+from bullet_store import BulletStore
+from bullet import GuidedBullet, EletricBullet
+from pool import Pool
+from loader import Loader
+from renderer import DirtyRenderer, interpolate, restore
+from profiler import FrameProfiler, ProfilerOverlay
+from replay import RECORDED_EVENTS
+from worker import COUNTER, LIFE, XP, RUN
+from bindings import Bindings, INPUT_MODES, coalesce
+from rotation import RotationCache
+import atlas
+
+# player images, one for each 45 degrees
+PLAYER_FRAMES = ["player_0.png", "player_45.png", "player_90.png",
+                 "player_135.png", "player_180.png", "player_225.png",
+                 "player_270.png", "player_315.png"]
+POWERUPS = ["first_aid_kit", "sw_mult", "sw_frag", "sw_guided", "sw_elet"]
+PLAYER_FIRE = ["fire", "sw_mult", "sw_frag", "sw_guided", "sw_elet"]
+BACKGROUND_IMAGES = ["earth.jpg", "321.png"]
+# simulation step, in ms. The game always advances by that, however long
+# frames take to draw
+STEP = 16
+# steps run on a single frame when catching up. When even that's not
+# enough, the game slows down
+MAX_STEPS = 5
 
 class Game:
     screen = None
@@ -34,30 +66,69 @@ class Game:
     run = True
     actors_list = None
     player = None
+    player_fire = False
     player_firing = False
     player_charging = 0
     rot_accel = 2
+    headless = False
+    # a simulation process handles the player but not the interface, while
+    # the process drawing it handles the interface only
+    handles_interface = True
+    handles_player = True
+    renderer = None
+    loaded_stage = None
+    time_to_first_frame = None
 
-    def __init__(self, preferences):
+    def __init__(self, preferences, headless=False, cache_dir=None,
+                 seed=None):
         """
         Starts pygamge, defines resolution, sets caption, disable mouse cursor.
+        If headless is True, the dummy video and audio drivers are used, so
+        the game can run without a display or audio device.
+        cache_dir is where generated data can be stored, if any.
+        seed is used to seed the game random numbers on setup, so the same
+        input produces the same game. If None, one is taken from the clock.
         """
-        # Set mixer arguments before modules initialization
-        pygame.mixer.pre_init(44100)
+        self.start_time = time.time()
+        if seed is None:
+            seed = int(self.start_time * 1000) & 0xffffffff
+        self.seed = seed
+        self.random = Random.Random(seed)
+        self.headless = headless
+        self.cache_dir = cache_dir
+        if headless:
+            # SDL reads the drivers from environment on initialization
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        else:
+            # Set mixer arguments before modules initialization
+            pygame.mixer.pre_init(44100)
         # initialize all needed pygame modules
         self.preferences = preferences
         pygame.init()
         flags = DOUBLEBUF
-        if preferences.screen_fullscreen:
+        if preferences.screen_fullscreen and not headless:
             flags |= FULLSCREEN
         # create display
-        self.screen = pygame.display.set_mode(preferences.screen_resolution, flags)
+        # the dummy driver defaults to 8 bits, where images with alpha
+        # can't be created
+        depth = 0
+        if headless:
+            depth = 32
+        self.screen = pygame.display.set_mode(preferences.screen_resolution,
+                                              flags, depth)
         self.screen_size = self.screen.get_size()
 
         # make mouse cursor invisible
         pygame.mouse.set_visible(False)
-        # grabs the mouse, so pygame has complete control over it
-        pygame.event.set_grab(True)
+        # grabs the mouse, so pygame has complete control over it. There is
+        # nothing to grab on headless mode.
+        if not headless:
+            pygame.event.set_grab(True)
+        # sprites are packed in sheets kept on the cache dir
+        self.atlas = None
+        if cache_dir:
+            self.atlas = atlas.load_or_build('graphic', cache_dir)
         # set title windows and icon
         win_icon = self.load_image("win_icon.png")
         pygame.display.set_caption('Dead Channel')
@@ -65,8 +136,8 @@ class Game:
 
         # initialize joysticks
         self.init_joysticks()
-        # load all images TODO: it could display a "loading" screen
-        self.load_images()
+        # load all images and the stage showing a "loading" screen
+        self.load_assets()
 
     def init_joysticks(self):
         """
@@ -76,249 +147,497 @@ class Game:
             joystick = pygame.joystick.Joystick(j)
             joystick.init()
 
-    def load_image(self, filename):
-        img = pygame.image.load(os.path.join('graphic', filename))
-        # disable alpha, it the image contains an alpha layer
-        img.set_alpha(None, RLEACCEL)
-        img = img.convert()
+    def load_image(self, filename, img=None):
+        """
+        Returns an image from the atlas, if it's there, or load it from disk
+        and convert. If img is given, it's the file already decoded.
+        """
+        if self.atlas and filename in self.atlas:
+            img = self.atlas.get(filename)
+        else:
+            if img is None:
+                img = pygame.image.load(os.path.join('graphic', filename))
+            # disable alpha, it the image contains an alpha layer
+            img.set_alpha(None, RLEACCEL)
+            img = img.convert()
         # colorkey is the color value that will be reference transparency
         img.set_colorkey((255,255,255), RLEACCEL)
         return img
 
-    def load_images(self):
+    def load_rotations(self, filename, img=None):
+        """
+        Load an image and build its rotation frames, as many as set by
+        preferences. They are read from the cache dir if saved before.
+        If img is given, it's the file already decoded.
+        """
+        frames = self.preferences.graphics_rotation_frames
+        path = os.path.join('graphic', filename)
+        if self.atlas and filename in self.atlas:
+            img = self.atlas.get(filename).copy()
+        elif img is None:
+            img = pygame.image.load(path)
+        # the colorkey becomes transparent alpha, so rotated frames can be
+        # smoothed
+        img.set_colorkey((255,255,255))
+        img = img.convert_alpha()
+        cache_file = None
+        if self.cache_dir and self.preferences.graphics_rotation_cache:
+            name = os.path.splitext(filename)[0]
+            cache_file = os.path.join(self.cache_dir,
+                                      "%s_%d.png" % (name, frames))
+        return RotationCache(img, frames, cache_file, path)
+
+    def queue_image(self, loader, filename, rotations=False):
+        """
+        Adds a job to loader to load an image, or its rotation frames if
+        rotations is True. Files out of the atlas are decoded by a worker
+        thread, then converted on the main thread.
+        """
+        work = None
+        if not self.atlas or filename not in self.atlas:
+            path = os.path.join('graphic', filename)
+            work = lambda: pygame.image.load(path)
+        if rotations:
+            finish = lambda img: self.load_rotations(filename, img)
+        else:
+            finish = lambda img: self.load_image(filename, img)
+        loader.add((filename, rotations), work, finish)
+
+    def queue_background(self, loader, filename):
+        """
+        Adds a job to loader to load a background image, that is kept by
+        Background, so it won't read the file again.
+        """
+        if filename in Background.loaded_imgs:
+            return
+        path = os.path.join('graphic', filename)
+        def finish(img):
+            img = img.convert_alpha()
+            Background.loaded_imgs[filename] = img
+            return img
+        loader.add(("background", filename), lambda: pygame.image.load(path),
+                   finish)
+
+    def parse_stage(self):
+        """
+        Parses the stage file, or starts streaming it if it's too long.
+        It can be called by a worker thread.
+        """
+        stage = open_stage("stage1.xml")
+        stage.buildStage()
+        return stage
+
+    def queue_stage(self, loader):
+        """
+        Adds a job to loader to parse the stage. The background tiles used
+        by the stage are loaded after it's parsed.
+        """
+        def finish(stage):
+            for item in stage.get_items():
+                if item.type == "background":
+                    self.queue_background(loader, item.image)
+            return stage
+        loader.add("stage", self.parse_stage, finish)
+
+    def load_images(self, loader):
+        """
+        Add jobs to loader to load all image files and convert, setting
+        the colorkey
+        """
+        rotations = bool(self.preferences.graphics_rotation_frames)
+        if rotations:
+            self.queue_image(loader, "player_0.png", True)
+        else:
+            # only the pre-drawn frames
+            for image in PLAYER_FRAMES:
+                self.queue_image(loader, image)
+        for image in ["enemy.png", "enemy_fire.png", "life.png"]:
+            self.queue_image(loader, image)
+        for image in POWERUPS:
+            self.queue_image(loader, image+".png")
+        for image in PLAYER_FIRE:
+            self.queue_image(loader, "player_"+image+".png", rotations)
+
+    def set_images(self, results):
         """
-        Load all image files and convert, setting the colorkey
+        Sets the image attributes with the images loaded
         """
-        self.image_player = []
-        for image in ["player_0.png", "player_45.png", "player_90.png",
-                      "player_135.png", "player_180.png", "player_225.png",
-                      "player_270.png", "player_315.png"]:
-            self.image_player.append(self.load_image(image))
-        self.image_enemy = self.load_image("enemy.png")
-        self.image_enemy_fire = self.load_image("enemy_fire.png")
-        self.image_life = self.load_image("life.png")
+        rotations = bool(self.preferences.graphics_rotation_frames)
+        if rotations:
+            self.image_player = results[("player_0.png", True)]
+        else:
+            self.image_player = [results[(image, False)]
+                                 for image in PLAYER_FRAMES]
+        self.image_enemy = results[("enemy.png", False)]
+        self.image_enemy_fire = results[("enemy_fire.png", False)]
+        self.image_life = results[("life.png", False)]
         self.image_powerup = {}
-        for image in ["first_aid_kit", "sw_mult", "sw_frag", "sw_guided",
-                      "sw_elet"]:
-            self.image_powerup[image] = self.load_image(image+".png")
+        for image in POWERUPS:
+            self.image_powerup[image] = results[(image+".png", False)]
         self.image_player_fire = {}
-        for image in ["fire", "sw_mult", "sw_frag", "sw_guided", "sw_elet"]:
-            self.image_player_fire[image] = self.load_image("player_"+image+".png")
+        for image in PLAYER_FIRE:
+            self.image_player_fire[image] = \
+                results[("player_"+image+".png", rotations)]
 
-    def handle_events(self, ms):
+    def get_image_table(self):
         """
-        Handle user's events.
+        Returns a list with every image an element may be drawn with, in an
+        order that only depends on the preferences, so another process
+        loading the same assets refers to an image by its index
         """
-        player = self.player
-        preferences = self.preferences
-        player_fire = False
+        sources = [self.image_enemy, self.image_enemy_fire, self.image_player]
+        sources += [self.image_powerup[image] for image in POWERUPS]
+        sources += [self.image_player_fire[image] for image in PLAYER_FIRE]
+        table = []
+        for source in sources:
+            if isinstance(source, list):
+                table += source
+            else:
+                table.append(source)
+        return table
+
+    def load_assets(self):
+        """
+        Loads images and parses the stage on worker threads, while a
+        progress screen is shown.
+        """
+        loader = Loader()
+        self.load_images(loader)
+        for image in BACKGROUND_IMAGES:
+            self.queue_background(loader, image)
+        self.queue_stage(loader)
+        if self.headless:
+            results = loader.run()
+        else:
+            self.loading_font = pygame.font.SysFont('verdana', 20)
+            results = loader.run(self.draw_loading)
+        self.set_images(results)
+        self.loaded_stage = results["stage"]
+        print "Assets loaded in %.3f s" % (time.time() - self.start_time)
+
+    def draw_loading(self, progress):
+        """
+        Draws the loading screen with a progress bar
+        """
+        w, h = self.screen_size
+        self.screen.fill((0, 0, 0))
+        bar = Rect(w / 4, h / 2 - 10, w / 2, 20)
+        fill = Rect(bar.left, bar.top, int(bar.width * progress), bar.height)
+        self.screen.fill((0x55, 0x55, 0x55), fill)
+        pygame.draw.rect(self.screen, (255, 255, 255), bar, 1)
+        text = self.loading_font.render("Loading... %d%%" % (progress * 100),
+                                        True, (255, 255, 255))
+        self.screen.blit(text, text.get_rect(midbottom=(w / 2, bar.top - 5)))
+        pygame.display.flip()
+
+    def report_first_frame(self):
+        """
+        Measures and reports the time from start to the first frame
+        """
+        self.time_to_first_frame = time.time() - self.start_time
+        print "Time to first frame: %.3f s" % self.time_to_first_frame
+
+    def secondary_fire(self):
+        """
+        Fire the selected secondary weapon, if any
+        """
+        sw = self.player.get_selected_secondary_weapon()
+        if sw == None:
+            return
+        self.player.fire(self.actors_list["fire"],
+            self.image_player_fire[sw.get_type()], False,
+            self.player_charging, self.actors_list["guided_fire"])
+
+    def handle_events(self, ms, events=None):
+        """
+        Handle user's events. If events isn't given, they are taken from the
+        pygame queue.
+        """
+        self.player_fire = False
         self.player_charging += ms
 
-        for event in pygame.event.get():
-            type = event.type
-            if type in (KEYDOWN, KEYUP):
-                key = event.key
-            elif type in (MOUSEBUTTONUP, MOUSEBUTTONDOWN):
-                button = event.button
-            elif type == MOUSEMOTION:
-                mouse_rel = event.rel
-            elif type in (JOYBUTTONUP, JOYBUTTONDOWN):
-                joy_id = event.joy
-                button = event.button
-            elif type == JOYAXISMOTION:
-                joy_id = event.joy
-                axis = event.axis
-                value = event.value
-            elif type == JOYHATMOTION:
-                joy_id = event.joy
-                value = event.value
-            elif type == QUIT:
-                self.run = False
-            if type == KEYDOWN:
-                if key == K_ESCAPE:
-                    self.run = False
+        if events is None:
+            events = pygame.event.get()
+        mode = self.preferences.general_input
+        dispatch = self.bindings.dispatch
+        for event in coalesce(events):
+            dispatch(mode, event)
 
-            if preferences.general_input in ("mouse", "keyboard"):
-                if type == KEYDOWN:
-                    if key == preferences.keyboard_up:
-                        player.accel_top()
-                    elif key == preferences.keyboard_down:
-                        player.accel_bottom()
-                    elif key == preferences.keyboard_right:
-                        player.accel_right()
-                    elif key == preferences.keyboard_left:
-                        player.accel_left()
-                    elif key == preferences.keyboard_player_play:
-                        self.music_player.play()
-                    elif key == preferences.keyboard_player_stop:
-                        self.music_player.stop()
-                    elif key == preferences.keyboard_player_next_track:
-                        self.music_player.next_track()
-                    elif key == preferences.keyboard_prev_secondary_weapon:
-                        player.prev_secondary_weapon()
-                    elif key == preferences.keyboard_next_secondary_weapon:
-                        player.next_secondary_weapon()
-                    elif key == preferences.keyboard_toogle_fullscreen:
-                        pygame.display.toggle_fullscreen()
-                elif type == KEYUP:
-                    if key == preferences.keyboard_down:
-                        player.accel_top()
-                    elif key == preferences.keyboard_up:
-                        player.accel_bottom()
-                    elif key == preferences.keyboard_left:
-                        player.accel_right()
-                    elif key == preferences.keyboard_right:
-                        player.accel_left()
-
-                if preferences.general_input == "keyboard":
-                    if type == KEYDOWN:
-                        if key == preferences.keyboard_fire:
-                            player_fire = True
-                            self.player_firing = True
-                        elif key == preferences.keyboard_secondary_fire:
-                            self.player_charging = 0
-                        elif key == preferences.keyboard_rot_clock:
-                            player.rotate_clock(self.rot_accel)
-                        elif key == preferences.keyboard_rot_anti_clock:
-                            player.rotate_clock(-self.rot_accel)
-                    elif type == KEYUP:
-                        if key == preferences.keyboard_rot_clock:
-                            player.rotate_clock(-self.rot_accel)
-                        elif key == preferences.keyboard_rot_anti_clock:
-                            player.rotate_clock(self.rot_accel)
-                        elif key == preferences.keyboard_fire:
-                            self.player_firing = False
-                        elif key == preferences.keyboard_secondary_fire:
-                            sw = player.get_selected_secondary_weapon()
-                            if sw == None:
-                                continue
-                            player.fire(self.actors_list["fire"],
-                                self.image_player_fire[sw.get_type()], False,
-                                self.actors_list["enemies"],
-                                self.player_charging)
-
-                elif preferences.general_input == "mouse":
-                    if type == MOUSEBUTTONDOWN:
-                        # mouse left button is 1, middle is 2, and right is 3
-                        if button == preferences.mouse_fire:
-                            player_fire = True
-                            self.player_firing = True
-                        elif button == preferences.mouse_secondary_fire:
-                            self.player_charging = 0
-                        elif button == preferences.mouse_prev_secondary_weapon:
-                            player.prev_secondary_weapon()
-                        elif button == preferences.mouse_next_secondary_weapon:
-                            player.next_secondary_weapon()
-                    elif type == MOUSEBUTTONUP:
-                        if button == preferences.mouse_fire:
-                            self.player_firing = False
-                        elif button == preferences.mouse_secondary_fire:
-                            sw = player.get_selected_secondary_weapon()
-                            if sw == None:
-                                continue
-                            player.fire(self.actors_list["fire"],
-                                self.image_player_fire[sw.get_type()], False,
-                                self.actors_list["enemies"],
-                                self.player_charging)
-
-                    elif type == MOUSEMOTION:
-                        # rel is a tuple with x and y relative movements
-                        # if player move the cursor down or left, it has
-                        # the same effect
-                        #FIXME HACK: the first rel is a huge number, the
-                        # difference between 0, 0 and the curson position.
-                        # So it needs to be avoided.
-                        # This hack should be removed after we include
-                        # screens before the game screen
-                        if mouse_rel[0] < 100 and mouse_rel[1] < 100:
-                            rot = player.get_rotation()
-                            rot = rot + int((mouse_rel[0] + mouse_rel[1]) *\
-                                             preferences.mouse_sensitivity)
-                            player.set_rotation(rot)
-
-            elif preferences.general_input in ("joystick_analogic",
-                                       "joystick_d-pad"):
-                if type == JOYBUTTONDOWN and joy_id == preferences.joystick_id:
-                    if button == preferences.joystick_fire:
-                        player_fire = True
-                        self.player_firing = True
-                    elif button == preferences.joystick_secondary_fire:
-                        self.player_charging = 0
-                    elif button == preferences.joystick_player_play:
-                        self.music_player.play()
-                    elif button == preferences.joystick_player_stop:
-                        self.music_player.stop()
-                    elif button == preferences.joystick_player_next_track:
-                        self.music_player.next_track()
-                    elif button == preferences.joystick_prev_secondary_weapon:
-                        player.prev_secondary_weapon()
-                    elif button == preferences.joystick_next_secondary_weapon:
-                        player.next_secondary_weapon()
-                elif type == JOYBUTTONUP and joy_id == preferences.joystick_id:
-                    if button == preferences.joystick_fire:
-                        self.player_firing = False
-                    elif button == preferences.joystick_secondary_fire:
-                        sw = player.get_selected_secondary_weapon()
-                        if sw == None:
-                            continue
-                        player.fire(self.actors_list["fire"],
-                            self.image_player_fire[sw.get_type()], False,
-                            self.actors_list["enemies"],
-                            self.player_charging)
-
-
-                if preferences.general_input == "joystick_analogic":
-                    if type == JOYAXISMOTION and joy_id == preferences.joystick_id:
-                        if axis == preferences.j_axis_x:
-                            if abs(value) > preferences.joystick_deadzone:
-                                h_speed = value * preferences.joystick_sensitivity
-                            else:
-                                h_speed = 0
-                            player.set_speed([h_speed, player.get_speed()[1]])
-                        elif axis == preferences.j_axis_y:
-                            if abs(value) > preferences.joystick_deadzone:
-                                v_speed = value * preferences.joystick_sensitivity
-                            else:
-                                v_speed = 0
-                            player.set_speed([player.get_speed()[0], v_speed])
-                        elif axis == preferences.j_axis_z:
-                            if abs(value) < preferences.joystick_deadzone:
-                                value = 0
-                            rot_speed = int(value* preferences.joystick_sensitivity)
-                            player.set_rotation_speed(rot_speed)
-
-                elif preferences.general_input == "joystick_d-pad":
-                    if type == JOYHATMOTION and joy_id == preferences.joystick_id:
-                        accel = player.get_accel()
-                        speed = [value[0] * accel[0], -value[1] * accel[1]]
-                        player.set_speed(speed)
-                    elif type == JOYBUTTONDOWN and \
-                         joy_id == preferences.joystick_id:
-                        if button == preferences.joystick_rot_clock:
-                                player.rotate_clock(self.rot_accel)
-                        elif button == preferences.joystick_rot_anti_clock:
-                                player.rotate_clock(-self.rot_accel)
-                    elif type == JOYBUTTONUP and joy_id == preferences.joystick_id:
-                        if button == preferences.joystick_rot_clock:
-                                player.rotate_clock(-self.rot_accel)
-                        elif button == preferences.joystick_rot_anti_clock:
-                                player.rotate_clock(self.rot_accel)
-
-        if player_fire or self.player_firing:
-            player.fire(self.actors_list["fire"],
-                        self.image_player_fire["fire"])
+        if self.player_fire or self.player_firing:
+            self.player.fire(self.actors_list["fire"],
+                             self.image_player_fire["fire"])
+
+    def build_bindings(self):
+        """
+        Compiles the input preferences into a dispatch table and lets only
+        the bound events into the queue. Interface actions, as quitting or
+        changing the music, and player actions are bound only if the game
+        handles them.
+        """
+        preferences = self.preferences
+        bindings = Bindings()
+        # actions handled by another process are left out, but their
+        # events are still let into the queue, to be sent there
+        skipped = Bindings()
+        bind_interface = bind = skipped.bind
+        if self.handles_interface:
+            bind_interface = bindings.bind
+        if self.handles_player:
+            bind = bindings.bind
+        keyboard = ["mouse", "keyboard"]
+        joystick = ["joystick_analogic", "joystick_d-pad"]
+        joy_id = preferences.joystick_id
+        rot_accel = self.rot_accel
+
+        bind_interface(INPUT_MODES, QUIT, None, self.quit)
+        bind_interface(INPUT_MODES, music.END_EVENT, None,
+                       lambda event: self.music_player.track_ended())
+        bind_interface(INPUT_MODES, KEYDOWN, K_ESCAPE, self.quit)
+        bind_interface(INPUT_MODES, KEYDOWN,
+                       preferences.keyboard_toogle_profiler,
+                       lambda event: self.profiler_overlay.toggle())
+
+        for key, method in [
+            (preferences.keyboard_up, Player.accel_top),
+            (preferences.keyboard_down, Player.accel_bottom),
+            (preferences.keyboard_right, Player.accel_right),
+            (preferences.keyboard_left, Player.accel_left),
+            (preferences.keyboard_prev_secondary_weapon,
+             Player.prev_secondary_weapon),
+            (preferences.keyboard_next_secondary_weapon,
+             Player.next_secondary_weapon)]:
+            bind(keyboard, KEYDOWN, key, self.player_action(method))
+        # releasing a key stops the acceleration
+        for key, method in [
+            (preferences.keyboard_down, Player.accel_top),
+            (preferences.keyboard_up, Player.accel_bottom),
+            (preferences.keyboard_left, Player.accel_right),
+            (preferences.keyboard_right, Player.accel_left)]:
+            bind(keyboard, KEYUP, key, self.player_action(method))
+        for key, method in [
+            (preferences.keyboard_player_play, Music_player.play),
+            (preferences.keyboard_player_stop, Music_player.stop),
+            (preferences.keyboard_player_next_track,
+             Music_player.next_track)]:
+            bind_interface(keyboard, KEYDOWN, key,
+                           self.music_action(method))
+        bind_interface(keyboard, KEYDOWN,
+                       preferences.keyboard_toogle_fullscreen,
+                       self.toggle_fullscreen)
+
+        bind(["keyboard"], KEYDOWN, preferences.keyboard_fire,
+             self.start_fire)
+        bind(["keyboard"], KEYUP, preferences.keyboard_fire, self.stop_fire)
+        bind(["keyboard"], KEYDOWN, preferences.keyboard_secondary_fire,
+             self.start_charging)
+        bind(["keyboard"], KEYUP, preferences.keyboard_secondary_fire,
+             self.release_charge)
+        bind(["keyboard"], KEYDOWN, preferences.keyboard_rot_clock,
+             self.rotate_action(rot_accel))
+        bind(["keyboard"], KEYUP, preferences.keyboard_rot_clock,
+             self.rotate_action(-rot_accel))
+        bind(["keyboard"], KEYDOWN, preferences.keyboard_rot_anti_clock,
+             self.rotate_action(-rot_accel))
+        bind(["keyboard"], KEYUP, preferences.keyboard_rot_anti_clock,
+             self.rotate_action(rot_accel))
+
+        # mouse left button is 1, middle is 2, and right is 3
+        bind(["mouse"], MOUSEBUTTONDOWN, preferences.mouse_fire,
+             self.start_fire)
+        bind(["mouse"], MOUSEBUTTONUP, preferences.mouse_fire, self.stop_fire)
+        bind(["mouse"], MOUSEBUTTONDOWN, preferences.mouse_secondary_fire,
+             self.start_charging)
+        bind(["mouse"], MOUSEBUTTONUP, preferences.mouse_secondary_fire,
+             self.release_charge)
+        bind(["mouse"], MOUSEBUTTONDOWN,
+             preferences.mouse_prev_secondary_weapon,
+             self.player_action(Player.prev_secondary_weapon))
+        bind(["mouse"], MOUSEBUTTONDOWN,
+             preferences.mouse_next_secondary_weapon,
+             self.player_action(Player.next_secondary_weapon))
+        bind(["mouse"], MOUSEMOTION, None, self.mouse_rotate)
+
+        for button, down, up in [
+            (preferences.joystick_fire, self.start_fire, self.stop_fire),
+            (preferences.joystick_secondary_fire, self.start_charging,
+             self.release_charge)]:
+            bind(joystick, JOYBUTTONDOWN, (joy_id, button), down)
+            bind(joystick, JOYBUTTONUP, (joy_id, button), up)
+        for button, method in [
+            (preferences.joystick_player_play, Music_player.play),
+            (preferences.joystick_player_stop, Music_player.stop),
+            (preferences.joystick_player_next_track,
+             Music_player.next_track)]:
+            bind_interface(joystick, JOYBUTTONDOWN, (joy_id, button),
+                           self.music_action(method))
+        for button, method in [
+            (preferences.joystick_prev_secondary_weapon,
+             Player.prev_secondary_weapon),
+            (preferences.joystick_next_secondary_weapon,
+             Player.next_secondary_weapon)]:
+            bind(joystick, JOYBUTTONDOWN, (joy_id, button),
+                 self.player_action(method))
+
+        bind(["joystick_analogic"], JOYAXISMOTION,
+             (joy_id, preferences.joystick_axis_x), self.joystick_move_x)
+        bind(["joystick_analogic"], JOYAXISMOTION,
+             (joy_id, preferences.joystick_axis_y), self.joystick_move_y)
+        bind(["joystick_analogic"], JOYAXISMOTION,
+             (joy_id, preferences.joystick_axis_z), self.joystick_rotate)
+
+        bind(["joystick_d-pad"], JOYHATMOTION, joy_id, self.joystick_hat)
+        for button, rot in [(preferences.joystick_rot_clock, rot_accel),
+                            (preferences.joystick_rot_anti_clock, -rot_accel)]:
+            bind(["joystick_d-pad"], JOYBUTTONDOWN, (joy_id, button),
+                 self.rotate_action(rot))
+            bind(["joystick_d-pad"], JOYBUTTONUP, (joy_id, button),
+                 self.rotate_action(-rot))
+
+        self.bindings = bindings
+        bindings.set_allowed(preferences.general_input,
+            *skipped.get_types(preferences.general_input))
+
+    def apply_preferences(self):
+        """
+        Applies preferences changed while the game runs. Screen preferences
+        take effect on next start.
+        """
+        self.build_bindings()
+        self.music_player.set_volume(self.preferences.general_music_volume)
+
+    def player_action(self, method):
+        """
+        Returns an action calling method of the player
+        """
+        return lambda event: method(self.player)
+
+    def music_action(self, method):
+        """
+        Returns an action calling method of the music player
+        """
+        return lambda event: method(self.music_player)
+
+    def rotate_action(self, rot_accel):
+        """
+        Returns an action changing the player rotation speed by rot_accel
+        """
+        return lambda event: self.player.rotate_clock(rot_accel)
+
+    def quit(self, event):
+        """
+        Ends the game
+        """
+        self.run = False
+
+    def start_fire(self, event):
+        """
+        Fires and keeps firing until the button is released
+        """
+        self.player_fire = True
+        self.player_firing = True
+
+    def stop_fire(self, event):
+        """
+        Stops firing
+        """
+        self.player_firing = False
+
+    def start_charging(self, event):
+        """
+        Starts charging the secondary weapon
+        """
+        self.player_charging = 0
+
+    def release_charge(self, event):
+        """
+        Fires the secondary weapon with the charge so far
+        """
+        self.secondary_fire()
+
+    def toggle_fullscreen(self, event):
+        """
+        Switches between fullscreen and window mode
+        """
+        pygame.display.toggle_fullscreen()
+        if self.renderer:
+            self.renderer.invalidate()
+
+    def mouse_rotate(self, event):
+        """
+        Rotates the player by the mouse movement
+        """
+        # rel is a tuple with x and y relative movements
+        # if player move the cursor down or left, it has
+        # the same effect. Jumps were dropped when the motions
+        # were merged.
+        mouse_rel = event.rel
+        player = self.player
+        rot = player.get_rotation()
+        rot = rot + int((mouse_rel[0] + mouse_rel[1]) *\
+                         self.preferences.mouse_sensitivity)
+        player.set_rotation(rot)
+
+    def get_axis_value(self, event):
+        """
+        Returns the joystick axis value, or 0 inside the deadzone
+        """
+        if abs(event.value) > self.preferences.joystick_deadzone:
+            return event.value
+        return 0
+
+    def joystick_move_x(self, event):
+        """
+        Sets the player horizontal speed by the joystick axis
+        """
+        player = self.player
+        h_speed = self.get_axis_value(event) * \
+            self.preferences.joystick_sensitivity
+        player.set_speed([h_speed, player.get_speed()[1]])
+
+    def joystick_move_y(self, event):
+        """
+        Sets the player vertical speed by the joystick axis
+        """
+        player = self.player
+        v_speed = self.get_axis_value(event) * \
+            self.preferences.joystick_sensitivity
+        player.set_speed([player.get_speed()[0], v_speed])
+
+    def joystick_rotate(self, event):
+        """
+        Sets the player rotation speed by the joystick axis
+        """
+        rot_speed = int(self.get_axis_value(event) *
+                        self.preferences.joystick_sensitivity)
+        self.player.set_rotation_speed(rot_speed)
+
+    def joystick_hat(self, event):
+        """
+        Sets the player speed by the joystick hat
+        """
+        player = self.player
+        accel = player.get_accel()
+        value = event.value
+        player.set_speed([value[0] * accel[0], -value[1] * accel[1]])
 
     def actors_update(self, dt, ms):
         """
         Updates actors and background
         """
-        self.background.update(dt)
+        # timers due on this step fire first
+        self.scheduler.advance(ms)
+        self.background.update(ms)
 
         x, y = self.player.get_pos()
 
+        # enemies and guided bullets are steered before moving
+        self.behaviours.update(self.counter, y)
+        self.targeting.update(self.actors_list["enemies"],
+                              self.actors_list["guided_fire"])
         for actor in self.actors_list.values():
             actor.update(dt, ms, self.counter, x, y)
 
+        self.music_player.update()
         self.hud.update(self.screen, ms)
 
     def actors_draw(self):
@@ -332,15 +651,51 @@ class Game:
 
         # draw the hud after all the actors, so it will be at the top
         self.hud.draw(self.screen)
+        self.profiler_overlay.draw(self.screen)
+
+    def get_collided(self, actor_group, group):
+        """
+        Returns the narrow phase test of elements of actor_group against the
+        ones of group, called with the rect and image of each, after their
+        rects collide
+        """
+        shape_a = self.shapes[actor_group]
+        shape_b = self.shapes[group]
+        return lambda rect_a, image_a, rect_b, image_b: \
+            collide(shape_a, rect_a, image_a, shape_b, rect_b, image_b)
 
-    def actor_check_hit(self, actor, actors_list, action):
+    def actor_check_hit(self, actor, group, action, actor_group="player"):
         """
-        Check if an actor hitted in others provided by a list. If it does,
-        call action.
+        Check if an actor hitted in others provided by the name of a group
+        bucketed on the collision grid, or of a BulletStore. If it does,
+        call action. actor_group is the name of the group of actor, whose
+        collision shape is used once the rects collide.
         """
+        collided = self.get_collided(actor_group, group)
+        # check if the actor is a store of bullets
+        if isinstance(actor, BulletStore):
+            hitted = actor.groupcollide(self.actors_list[group],
+                lambda rect, image, sprite:
+                    collided(rect, image, sprite.rect, sprite.image))
+            for v in hitted.values():
+                for o in v:
+                    action(o)
+            # regular bullets are destroyed when colliding
+            actor.kill(hitted.keys())
+            return hitted
+
         # check if the actor is instance of a group of sprites
-        if isinstance(actor, pygame.sprite.RenderPlain):
-            hitted = pygame.sprite.groupcollide(actor, actors_list, 0, 0)
+        elif isinstance(actor, pygame.sprite.RenderPlain):
+            # all the hits are gathered before calling any action, as
+            # groupcollide does
+            hitted = {}
+            for o in actor.sprites():
+                collided_list = [obj for obj in
+                                 self.grid.query(o.rect, group)
+                                 if collided(o.rect, o.image,
+                                             obj.rect, obj.image)]
+                if collided_list:
+                    hitted[o] = collided_list
             for v in hitted.values():
                 for o in v:
                     action(o)
@@ -348,10 +703,23 @@ class Game:
                 o.do_collision()
             return hitted
 
+        # check if the actor is a sprite hitted by bullets
+        elif isinstance(self.actors_list[group], BulletStore):
+            store = self.actors_list[group]
+            hits = store.collide_rect(actor.rect,
+                lambda rect, image:
+                    collided(actor.rect, actor.image, rect, image))
+            for i in hits:
+                action()
+            store.kill(hits)
+            return actor.is_dead()
+
         # check if the actor is a sprite
         elif isinstance(actor, pygame.sprite.Sprite):
-            # third argument is dokill (if true the object will be killed)
-            collided_list = pygame.sprite.spritecollide(actor, actors_list, 0)
+            collided_list = [obj for obj in
+                             self.grid.query(actor.rect, group)
+                             if collided(actor.rect, actor.image,
+                                         obj.rect, obj.image)]
             for obj in collided_list:
                 if isinstance(obj, PowerUp):
                     if action(obj.get_type(), obj.get_pu_attr()):
@@ -365,132 +733,395 @@ class Game:
         """
         Check for hits and if the player is dead.
         """
+        # bucket the possible targets once, all the checks query the grid
+        self.grid.build({
+            "enemies" : self.actors_list["enemies"],
+            "powerups" : self.actors_list["powerups"],
+        })
+
         # check if player was hitted by a bullet
-        self.actor_check_hit(self.player, self.actors_list["enemies_fire"],
+        self.actor_check_hit(self.player, "enemies_fire",
                              self.player.do_collision)
         if self.player.is_dead():
             self.run = False
             return
 
         # check if the player get a powerup
-        self.actor_check_hit(self.player, self.actors_list["powerups"],
+        self.actor_check_hit(self.player, "powerups",
                              self.player.get_powerup)
 
         # check if the player collided with an enemy
-        self.actor_check_hit(self.player, self.actors_list["enemies"],
+        self.actor_check_hit(self.player, "enemies",
                              self.player.do_collision)
         if self.player.is_dead():
             self.run = False
             return
 
         # check if enemies were hitted by a bullet
-        hitted = self.actor_check_hit(self.actors_list["fire"],
-                                      self.actors_list["enemies"],
-                                          Enemy.do_collision)
+        hitted = self.actor_check_hit(self.actors_list["fire"], "enemies",
+                                      Enemy.do_collision, "fire")
+        guided_hitted = self.actor_check_hit(self.actors_list["guided_fire"],
+                                             "enemies", Enemy.do_collision,
+                                             "guided_fire")
 
         # increase xp based on hits
-        self.player.set_xp(self.player.get_xp() + len(hitted))
+        self.player.set_xp(self.player.get_xp() + len(hitted) +
+                           len(guided_hitted))
+
+    def add_enemy(self, enemy):
+        """
+        Adds enemy to the game, moving by its behaviour and firing from time
+        to time
+        """
+        self.actors_list["enemies"].add(enemy)
+        self.behaviours.add(enemy, self.counter)
+        enemy.schedule_fire(self.scheduler, self.actors_list["enemies_fire"],
+                            self.image_enemy_fire)
 
     def manage_elements(self, stage):
         """
         Creates enemies and itens based on the xml parsed file
         """
-        self.ticks += 1
-        # enemies fire randomly
-        if self.ticks > Random.randint(20,30):
-            for enemy in self.actors_list["enemies"].sprites():
-                if Random.randint(0,10) > 5:
-                    enemy.fire(self.actors_list["enemies_fire"],
-                               self.image_enemy_fire)
-                self.ticks = 0
-
         # creates enemies based on xml file
         L = stage.pop(self.counter)
         for element in L:
             if element.type == "enemy":
                 # FIX: Create enemies and itens similarly (create a generic class)
-                enemy = Enemy([0, 0], 0, int(element.life), element.behaviour,
-                              0, self.image_enemy)
+                enemy = Enemy.pool.acquire([0, 0], 0, element.life,
+                                           element.behaviour, 0,
+                                           self.image_enemy)
                 size = enemy.get_size()
                 # FIX: Should random y be kept like below?
-                y = int(element.pos_y)
+                y = element.pos_y
                 if y == 0:
-                    y = Random.randint(size[1] / 2, self.screen_size[1] - size[1] / 2)
+                    y = self.random.randint(size[1] / 2,
+                        self.screen_size[1] - size[1] / 2)
                 pos = [self.screen_size[0] + size[0] / 2, y]
                 enemy.set_pos(pos)
-                # add sprite to group
-                self.actors_list["enemies"].add(enemy)
+                self.add_enemy(enemy)
+            elif element.type == "behaviour":
+                self.behaviours.define(element.name,
+                                       [element.speed_x, element.speed_y],
+                                       element.zigzag, element.seek)
             elif element.type in ["first_aid_kit", "sw_mult", "sw_frag",
                                   "sw_guided", "sw_elet"]:
-                powerup = PowerUp([0,0], int(element.time),
-                                  [int(element.speed_x), int(element.speed_y)],
+                powerup = PowerUp.pool.acquire([0,0], element.time,
+                                  [element.speed_x, element.speed_y],
                                   element.type, element.pu_attr,
                                   self.image_powerup[element.type])
                 size = powerup.get_size()
-                y = Random.randint(size[1] / 2, self.screen_size[1] - size[1] / 2)
+                y = self.random.randint(size[1] / 2,
+                    self.screen_size[1] - size[1] / 2)
                 pos = [self.screen_size[0] + size[0] / 2, y]
                 powerup.set_pos(pos)
                 self.actors_list["powerups"].add(powerup)
+                powerup.schedule(self.scheduler)
             elif element.type == "background":
-                self.background.nextTile(element.image, 1)
+                self.background.nextTile(element.image, element.layer)
 
-    def loop(self):
+    def setup(self):
         """
-        Main loop
+        Loads stage, background, player, HUD and music player, leaving
+        everything ready to the first tick.
         """
-
-        # loads stage configuration
-        stage = Stage("stage1.xml")
-        stage.buildStage()
+        # stage configuration is parsed while loading assets
+        if self.loaded_stage:
+            self.stage = self.loaded_stage
+            self.loaded_stage = None
+        else:
+            self.stage = self.parse_stage()
         self.counter = 0
+        self.random.seed(self.seed)
+        # timers of the simulation, as cooldowns and enemy fire
+        self.scheduler = Scheduler(self.random)
+        Player.scheduler = self.scheduler
 
         # creates the background
-        self.background = Background("earth.jpg", "321.png")
-
-        #starts clock
-        clock = pygame.time.Clock()
-        dt = 16
-        self.ticks = 0
+        self.background = Background(BACKGROUND_IMAGES)
 
         # the player starts from the left center point of the screen
         pos = [0, self.screen_size[1] / 2]
         self.player = Player(pos, life=10, image=self.image_player)
 
         self.hud = HUD(self.player, [20, 30], self.image_life)
-        # RenderPlain is a container class for many Sprites
+        # RenderUpdates is a container class for many Sprites, that keeps
+        # track of the changed areas when drawing. OrderedUpdates also keeps
+        # the order sprites were added, so each run goes the same way.
+        # Regular bullets are kept by BulletStores, that work the same way.
         self.actors_list = {
-            "enemies" : pygame.sprite.RenderPlain(),
-            "enemies_fire" : pygame.sprite.RenderPlain(),
-            "player": pygame.sprite.RenderPlain(self.player),
-            "fire" : pygame.sprite.RenderPlain(),
-            "powerups" : pygame.sprite.RenderPlain(),
+            "enemies" : pygame.sprite.OrderedUpdates(),
+            "enemies_fire" : BulletStore(),
+            "player": pygame.sprite.RenderUpdates(self.player),
+            "fire" : BulletStore(),
+            "guided_fire" : pygame.sprite.OrderedUpdates(),
+            "powerups" : pygame.sprite.OrderedUpdates(),
         }
+        # collision broadphase, rebuilt on each tick
+        self.grid = SpatialGrid()
+        # collision shapes of each group, tested once rects collide. The
+        # player frames are rotated, their masks are built beforehand.
+        self.shapes = make_shapes()
+        self.shapes["player"].prepare(self.image_player)
+        # targets of the guided bullets, locked on each tick
+        self.targeting = Targeting()
+        # speeds of the enemies, by behaviour. Stages may define more.
+        self.behaviours = BehaviourEngine()
+        Enemy.engine = self.behaviours
+        self.create_pools()
+
+        # times the phases of each frame
+        self.profiler = FrameProfiler(self.actors_list,
+                                      self.preferences.debug_profile_frames)
+        self.profiler_overlay = ProfilerOverlay(self.profiler)
 
-        # loads music player
-        self.music_player = Music_player(self.hud,
-            self.preferences.general_music_volume,
-            self.preferences.general_use_default_setlist,
-            self.preferences.general_music_dir)
+        # only changed areas of the screen are updated if preferred
+        if self.preferences.screen_dirty_rects:
+            self.renderer = DirtyRenderer(self.screen, self.background,
+                                          self.hud, self.actors_list.values())
+            self.renderer.add_overlay(self.profiler_overlay)
+        else:
+            self.renderer = None
+
+        # loads music player. On headless mode the playlist is left empty,
+        # so the mixer is never touched.
+        if self.headless:
+            self.music_player = Music_player(self.hud)
+        else:
+            index_file = None
+            if self.cache_dir:
+                index_file = os.path.join(self.cache_dir, 'music_index.json')
+            self.music_player = Music_player(self.hud,
+                self.preferences.general_music_volume,
+                self.preferences.general_use_default_setlist,
+                self.preferences.general_music_dir, index_file)
         # loads next music
         self.music_player.load_next()
         # Starts playing music
         self.music_player.play()
+        # audio work blocks the main thread inside the phases
+        self.profiler.add_clock("audio",
+                                self.music_player.get_main_thread_time)
+
+        self.build_bindings()
+
+    def create_pools(self):
+        """
+        Creates the pools of enemies, power-ups and guided bullets, with the
+        number of free objects set by preferences.
+        """
+        preferences = self.preferences
+        self.pools = {
+            "enemies" : Pool(Enemy),
+            "powerups" : Pool(PowerUp),
+            "guided_bullets" : Pool(GuidedBullet),
+            "eletric_bullets" : Pool(EletricBullet),
+        }
+        Enemy.pool = self.pools["enemies"]
+        PowerUp.pool = self.pools["powerups"]
+        GuidedBullet.pool = self.pools["guided_bullets"]
+        EletricBullet.pool = self.pools["eletric_bullets"]
+
+        self.pools["enemies"].prewarm(preferences.pool_enemies, [0, 0],
+                                      image=self.image_enemy)
+        self.pools["powerups"].prewarm(preferences.pool_powerups, [0, 0],
+            image=self.image_powerup["first_aid_kit"])
+        for name in ["guided_bullets", "eletric_bullets"]:
+            self.pools[name].prewarm(preferences.pool_guided_bullets,
+                [0, 0], image=self.image_player_fire["sw_guided"])
+
+    def tick(self, dt, ms, events=None):
+        """
+        Runs a single simulation step: input, update, hits and spawning.
+        """
+        profiler = self.profiler
+        # handle input
+        self.handle_events(ms, events)
+        profiler.mark("events")
+        # update all the game elements
+        self.actors_update(dt, ms)
+        profiler.mark("update")
+        self.actors_act()
+        profiler.mark("act")
+
+        # create enemies based on xml file
+        self.manage_elements(self.stage)
+        profiler.mark("elements")
+
+    def loop(self, recorder=None, replay=None):
+        """
+        Main loop. If a recorder is given, the input and time of each frame
+        are recorded. If a replay is given, they are read from it instead,
+        and the loop ends with the recording. The game must be created with
+        the seed of the recording to replay it.
+        """
+        self.setup()
+
+        #starts clock
+        clock = pygame.time.Clock()
+        # frames are drawn as often as allowed, the simulation runs in
+        # fixed steps of STEP ms, as many as the time passed asks for
+        fps = self.preferences.screen_max_fps
+        # recorded time is used when replaying, so there's no need to wait
+        # for it if nobody is watching
+        if replay and self.headless:
+            fps = 0
+        # time not simulated yet, and input not handled yet
+        accumulator = 0
+        events = []
 
         while self.run:
             # miliseconds since last frame
-            ms = clock.tick(1000/dt)
+            ms = clock.tick(fps)
+            profiler = self.profiler
+            profiler.begin(self.counter)
 
-            # handle input
-            self.handle_events(ms)
-            # update all the game elements
-            self.actors_update(dt, ms)
-            self.actors_act()
+            if replay:
+                frame = replay.next()
+                if frame is None:
+                    break
+                ms, frame_events = frame
+                # the live queue still ends the game and the music tracks
+                frame_events += [event for event in pygame.event.get()
+                                 if event.type not in RECORDED_EVENTS or
+                                 event.type == QUIT]
+            else:
+                frame_events = pygame.event.get()
+                if recorder:
+                    recorder.record(ms, frame_events)
+            events += frame_events
 
-            # create enemies based on xml file
-            self.manage_elements(stage)
+            # under load, many steps run before drawing again, skipping
+            # frames. Time beyond MAX_STEPS is dropped.
+            accumulator = min(accumulator + ms, STEP * MAX_STEPS)
+            while accumulator >= STEP and self.run:
+                self.tick(STEP, STEP, events)
+                events = []
+                accumulator -= STEP
+                self.counter += 1
 
-            # draw the elements to the back buffer
-            self.actors_draw()
-            # flip the front and back buffer
+            # sprites are drawn between the last two steps, by the time
+            # left to simulate
+            moved = interpolate(self.actors_list.values(),
+                                float(accumulator) / STEP)
+            if self.renderer:
+                # draw and update only what changed
+                rects = self.renderer.render()
+                profiler.mark("draw")
+                self.renderer.present(rects)
+            else:
+                # draw the elements to the back buffer
+                self.actors_draw()
+                profiler.mark("draw")
+                # flip the front and back buffer
+                pygame.display.flip()
+            restore(moved)
+            profiler.mark("flip")
+            profiler.end()
+            # edits on the preferences file are applied right away
+            if self.preferences.poll():
+                self.apply_preferences()
+            if self.time_to_first_frame is None:
+                self.report_first_frame()
+
+    def follow_stage(self, counter):
+        """
+        Moves the background as the simulation did up to counter, when the
+        simulation runs on another process
+        """
+        if counter <= self.counter:
+            return
+        # the stage gives every item up to the position asked
+        for element in self.stage.pop(counter - 1):
+            if element.type == "background":
+                self.background.nextTile(element.image, element.layer)
+        self.background.update(STEP * (counter - self.counter))
+        self.counter = counter
+
+    def draw_snapshot(self, header, elements):
+        """
+        Draws a snapshot of a simulation running on another process
+        """
+        self.background.draw(self.screen)
+        table = self.image_table
+        batch = [(table[i], (x, y)) for i, x, y in elements.tolist()]
+        if hasattr(self.screen, "blits"):
+            self.screen.blits(batch, False)
+        else:
+            for image, pos in batch:
+                self.screen.blit(image, pos)
+        self.player.life = int(header[LIFE])
+        self.player.set_xp(int(header[XP]))
+        self.hud.draw(self.screen)
+        self.profiler_overlay.draw(self.screen)
+
+    def loop_worker(self, worker):
+        """
+        Main loop when the simulation runs on worker, a SimulationWorker.
+        Input is sent to it and the last snapshot it wrote is drawn on
+        each frame, so the simulation doesn't take the frame time.
+        """
+        self.handles_player = False
+        self.setup()
+        self.image_table = self.get_image_table()
+        clock = pygame.time.Clock()
+        fps = self.preferences.screen_max_fps
+
+        while self.run:
+            ms = clock.tick(fps)
+            profiler = self.profiler
+            profiler.begin(self.counter)
+            events = pygame.event.get()
+            worker.send(events)
+            # the interface is handled here, the player there
+            mode = self.preferences.general_input
+            for event in coalesce(events):
+                self.bindings.dispatch(mode, event)
+            profiler.mark("events")
+            self.music_player.update()
+            self.hud.update(self.screen, ms)
+            snapshot = worker.read()
+            profiler.mark("update")
+            if snapshot is not None:
+                header, elements = snapshot
+                if not header[RUN] or not worker.is_alive():
+                    self.run = False
+                self.follow_stage(int(header[COUNTER]))
+                self.draw_snapshot(header, elements)
+            profiler.mark("draw")
             pygame.display.flip()
+            profiler.mark("flip")
+            profiler.end()
+            if self.preferences.poll():
+                self.apply_preferences()
+            if self.time_to_first_frame is None and snapshot is not None:
+                self.report_first_frame()
+        worker.stop()
+
+    def simulate(self, ticks, render=False, scenario=None):
+        """
+        Runs at most ticks simulation steps as fast as possible, with a fixed
+        frame time, and returns how many were run. If render is True, the
+        elements are drawn to the screen surface, but it's never flipped.
+        scenario, if given, has setup(game) called after the game setup and
+        tick(game) called before each tick, to drive the game instead of
+        the player.
+        """
+        self.setup()
+        if scenario:
+            scenario.setup(self)
+        dt = STEP
+
+        while self.run and self.counter < ticks:
+            # scenario work isn't timed as part of the frame
+            if scenario:
+                scenario.tick(self)
+            profiler = self.profiler
+            profiler.begin(self.counter)
+            self.tick(dt, dt)
+            if render:
+                self.actors_draw()
+            profiler.mark("draw")
+            profiler.mark("flip")
+            profiler.end()
             self.counter += 1
+        return self.counter
@@ -16,24 +16,39 @@ from pygame.locals import *
 class GameObject(pygame.sprite.Sprite):
     """
     Base class that represents all the objects in game.
-    It inherits from Sprite and has a rect that makes easy to move the image
+    It inherits from Sprite and has a rect that makes easy to move the image.
+    The constructor arguments are handled by reset(), that subclasses
+    override, so pooled objects can be set up again in place.
     """
     images = None
-    def __init__(self, image, position, rotation=0, speed=None,
-                 rotation_speed=0):
+    # pool the object is sent back to when killed, if any
+    pool = None
+    in_pool = False
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the sprite and get the screen area, then reset the object
+        with the given arguments.
+        """
+        pygame.sprite.Sprite.__init__(self)
+        screen = pygame.display.get_surface()
+        self.area = screen.get_rect()
+        self.reset(*args, **kwargs)
+
+    def reset(self, image, position, rotation=0, speed=None,
+              rotation_speed=0):
         """
         Load the object image, create a rect, set position and
         speed (static by default).
         """
-        pygame.sprite.Sprite.__init__(self)
         if isinstance(image, list):
             self.image = image[0]
             self.images = image
         else:
             self.image = image
+            self.images = None
         self.rect = self.image.get_rect()
-        screen = pygame.display.get_surface()
-        self.area = screen.get_rect()
+        # rect before the last update, to draw between both
+        self.prev_rect = self.rect
 
         self.set_pos(position)
         self.set_rotation(rotation)
@@ -45,6 +60,7 @@ class GameObject(pygame.sprite.Sprite):
         Updates the position and rotation angle and destroy the object
         if it's out of the screen
         """
+        self.prev_rect = self.rect
         self.set_rotation(self.rotation + self.rotation_speed)
         if self.images:
             self.image = self.images[self.rotation * len(self.images) / 360]
@@ -56,6 +72,14 @@ class GameObject(pygame.sprite.Sprite):
             (self.rect.top > self.area.bottom):
             self.kill()
 
+    def kill(self):
+        """
+        Remove the object from all groups and send it back to its pool
+        """
+        pygame.sprite.Sprite.kill(self)
+        if self.pool is not None:
+            self.pool.release(self)
+
     def get_speed(self):
         """
         Return object speed
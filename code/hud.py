@@ -11,8 +11,6 @@
 # Released under GNU GPL, read the file 'COPYING' for more information
 # ----------------------------------------------------------------------
 
-import copy
-
 import pygame
 from pygame.locals import *
 
@@ -25,15 +23,20 @@ TRACK_INFO_BOX_MARGIN = (15, 15)    # (TB, LR)
 TRACK_INFO_BOX_ANIM_TIME = 500
 # Time that track info will be shown
 TRACK_INFO_TIME = 3000
+# Time from going in to going out
+TRACK_INFO_TOTAL_TIME = TRACK_INFO_TIME + (2 * TRACK_INFO_BOX_ANIM_TIME)
+# Track box background color and opacity
+TRACK_INFO_BOX_COLOR = (0, 0, 0)
+TRACK_INFO_BOX_ALPHA = 200
 
 class HUD:
     """
     HUD (Heads-Up Display) class. It displays info as life and experience
     points.
     """
-    last_xp = -1
-    image_font = None
     track_info = None
+    status_state = None
+    image_status = None
 
     def __init__(self, player, pos=None, image_life=None):
         """
@@ -53,6 +56,10 @@ class HUD:
         self.start_showing_track = False
         self.showing_track = False
         self.hide_track = False
+        self.status_pos = [self.pos[0] + self.size_image_life[0], self.pos[1]]
+        # blits of composed surfaces and times they were composed
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def set_track_info(self, info):
         """
@@ -99,28 +106,55 @@ class HUD:
 
         text0 = "%s by %s"  % (title, artist)
         text1 = "%s %s"   % (album, date)
-        # print "Rendering track info: %s" % text
         self.font.set_bold(True)
-        image_track_ln0 = self.font.render(text0, True, fcolor)
+        image_track_ln0 = self.font.render(text0, True, fcolor,
+                                           TRACK_INFO_BOX_COLOR)
         self.font.set_bold(False)
-        image_track_ln1 = self.font.render(text1, True, fcolor)
+        image_track_ln1 = self.font.render(text1, True, fcolor,
+                                           TRACK_INFO_BOX_COLOR)
         # Gets rendered text size
         wf0, hf0 = image_track_ln0.get_size()
         wf1, hf1 = image_track_ln1.get_size()
-        # Creates box background
+        # Creates box background. It's an opaque surface blended with a
+        # single alpha value, much cheaper to blit than per pixel alpha.
         bg_size = [max(wf1, wf0) + (TRACK_INFO_BOX_MARGIN[0] * 2),
             hf1 + hf0 + (TRACK_INFO_BOX_MARGIN[1] * 2)]
-        bg = pygame.Surface(bg_size, HWSURFACE | SRCALPHA)
-        bg.fill((0, 0, 0, 200))
+        bg = pygame.Surface(bg_size)
+        bg.fill(TRACK_INFO_BOX_COLOR)
 
-        #self.trackbox_pos = [(TRACK_INFO_BOX_POS[0] * w) - bg_size[0],
-        #    (TRACK_INFO_BOX_POS[1] * h) - bg_size[1]]
         # Blits text to background
         bg.blit(image_track_ln0,
             [TRACK_INFO_BOX_MARGIN[0], TRACK_INFO_BOX_MARGIN[1]])
         bg.blit(image_track_ln1,
             [TRACK_INFO_BOX_MARGIN[0], hf0 + TRACK_INFO_BOX_MARGIN[1]])
-        return bg
+        bg.set_alpha(TRACK_INFO_BOX_ALPHA, RLEACCEL)
+        return bg.convert()
+
+    def __render_trackbox_strip(self, w):
+        """
+        Computes the x position of the track box for each ms of its
+        animation, so sliding it only looks up a list.
+        """
+        wtb = self.image_trackbox.get_width()
+        trackbox_minw = (TRACK_INFO_BOX_POS[0] * w) - wtb
+        # Calculates v0 (pixels/ms) v0 = 2*dS/tf
+        v0 = (2 * (trackbox_minw - w)) / TRACK_INFO_BOX_ANIM_TIME
+        # Calculates acceleration (pixels/ms^2) a = -v0/tf
+        a_in = -v0 / TRACK_INFO_BOX_ANIM_TIME
+        a_out = 2 * (w - trackbox_minw) / (TRACK_INFO_BOX_ANIM_TIME**2)
+        strip = []
+        for elapsed in range(TRACK_INFO_TOTAL_TIME + 1):
+            if elapsed < TRACK_INFO_BOX_ANIM_TIME:
+                # "Go in" animation, S = S0 + V0*t + (a*t^2)/2
+                x = w + (v0 * elapsed) + ((a_in * (elapsed**2)) / 2.0)
+            elif elapsed > TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME:
+                # "Go out" animation, S = S0 + (a*t^2)/2
+                t = elapsed - (TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME)
+                x = trackbox_minw + ((a_out * (t**2)) / 2.0)
+            else:
+                x = trackbox_minw
+            strip.append(int(x))
+        return strip
 
     def __update_trackbox(self, screen, ms):
         """
@@ -128,55 +162,35 @@ class HUD:
         """
         if not self.track_info:
             return
-        info = self.track_info
         w, h = screen.get_size()
         if self.start_showing_track and not self.hide_track:
             self.showing_track = True
             self.elapsed_time_showing_track = 0
             self.start_showing_track = False
+            # the box is rendered once each time it's shown
+            self.cache_misses += 1
             self.image_trackbox = self.__render_trackbox()
+            self.trackbox_strip = self.__render_trackbox_strip(w)
             htb = self.image_trackbox.get_height()
-            self.trackbox_pos = [w, (TRACK_INFO_BOX_POS[1] * h) - htb]
+            self.trackbox_pos = [w, int((TRACK_INFO_BOX_POS[1] * h) - htb)]
             self.hide_track = False
         elif self.showing_track:
             elapsed = self.elapsed_time_showing_track
-            if elapsed > TRACK_INFO_TIME + (2 * TRACK_INFO_BOX_ANIM_TIME):
+            if elapsed > TRACK_INFO_TOTAL_TIME:
                 self.showing_track = False
                 self.trackbox_pos[0] = w
                 self.hide_track = False
                 self.elapsed_time_showing_track = 0
             else:
                 elapsed += ms
-                wtb = self.image_trackbox.get_width()
-                trackbox_minw = (TRACK_INFO_BOX_POS[0] * w) - wtb
-                if elapsed < TRACK_INFO_BOX_ANIM_TIME:
-                    if self.hide_track:
-                        elapsed = 2 * TRACK_INFO_BOX_ANIM_TIME + \
-                            TRACK_INFO_TIME - elapsed
-                    else:
-                        # "Go in" animation
-                        # Calculates its position on HUD during animation
-                        # Calculates v0 (pixels/ms) v0 = 2*dS/tf
-                        v0 = (2 * (trackbox_minw - w)) / TRACK_INFO_BOX_ANIM_TIME
-                        # Calculates acceleration (pixels/ms^2) a = -v0/tf
-                        a = -v0 / TRACK_INFO_BOX_ANIM_TIME
-                        # S = S0 + V0*t + (a*t^2)/2
-                        self.trackbox_pos[0] = w + (v0 * float(elapsed)) + \
-                            ((a * (float(elapsed)**2)) / 2.0)
-                elif elapsed > TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME:
-                    t = float(elapsed - (TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME))
-                    # "Go out" animation
-                    # Calculates its position on HUD during animation
-                    # Calculates acceleration (pixels/ms^2) a = -v0/tf
-                    a = 2 * (w - trackbox_minw) / (TRACK_INFO_BOX_ANIM_TIME**2)
-                    # S = S0 + V0*t + (a*t^2)/2
-                    self.trackbox_pos[0] = trackbox_minw + ((a * (t**2)) / 2.0)
-                else:
-                    if self.hide_track:
+                if self.hide_track:
+                    if elapsed < TRACK_INFO_BOX_ANIM_TIME:
+                        # go out from where it is
+                        elapsed = TRACK_INFO_TOTAL_TIME - elapsed
+                    elif elapsed <= TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME:
                         elapsed = TRACK_INFO_BOX_ANIM_TIME + TRACK_INFO_TIME
-                        print "HIDING TRACK"
-                    self.trackbox_pos[0] = trackbox_minw
-
+                frame = min(int(elapsed), TRACK_INFO_TOTAL_TIME)
+                self.trackbox_pos[0] = self.trackbox_strip[frame]
                 self.elapsed_time_showing_track = elapsed
 
     def update(self, screen, ms):
@@ -190,36 +204,51 @@ class HUD:
         Draws currently playing track info
         """
         if self.showing_track:
-            screen.blit(self.image_trackbox, self.trackbox_pos)
-
-    def draw_life(self, screen):
-        """
-        Draw the life bar.
-        """
-        # makes a shallow copy
-        pos = copy.copy(self.pos)
-        for i in range(self.player.get_life()):
-            pos[0] += self.size_image_life[0]
-            screen.blit(self.image_life, pos)
+            self.cache_hits += 1
+            return [screen.blit(self.image_trackbox, self.trackbox_pos)]
+        return []
+
+    def render_status(self, life, xp):
+        """
+        Composes life bar and XP points on a single surface.
+        """
+        w, h = self.size_image_life
+        text = "XP: % 4d" % xp
+        image_font = self.font.render(text, True, self.fcolor)
+        wf, hf = image_font.get_size()
+        # life bar starts one image away from pos, and XP 12 images away
+        status = pygame.Surface((11 * w + wf, max(h, hf)), SRCALPHA)
+        for i in range(life):
+            status.blit(self.image_life, (i * w, 0))
+        status.blit(image_font, (11 * w, 0))
+        return status.convert_alpha()
+
+    def draw_status(self, screen):
+        """
+        Draws life bar and XP points, composing them again only if they
+        have changed.
+        """
+        state = (self.player.get_life(), self.player.get_xp())
+        if state != self.status_state:
+            self.cache_misses += 1
+            self.status_state = state
+            self.image_status = self.render_status(*state)
+        else:
+            self.cache_hits += 1
+        return screen.blit(self.image_status, self.status_pos)
 
-    def draw_xp(self, screen):
+    def get_cache_stats(self):
         """
-        Draw XP points.
+        Returns how many HUD blits reused a composed surface and how many
+        had to compose it first.
         """
-        pos = copy.copy(self.pos)
-        pos[0] += 12 * self.size_image_life[0]
-        xp = self.player.get_xp()
-        # only render the text again if xp has changed
-        if self.last_xp != xp:
-            self.last_xp = xp
-            text = "XP: % 4d" % xp
-            self.image_font = self.font.render(text, True, self.fcolor)
-        screen.blit(self.image_font, pos)
+        return {"hits" : self.cache_hits, "misses" : self.cache_misses}
 
     def draw(self, screen):
         """
         Draw the HUD. Basically calls each pieces of information draw method.
+        Returns the list of rects drawn.
         """
-        self.draw_life(screen)
-        self.draw_xp(screen)
-        self.draw_track_info(screen)
+        rects = [self.draw_status(screen)]
+        rects += self.draw_track_info(screen)
+        return rects
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import sys
+import time
+import threading
+import Queue
+import pygame
+
+# number of worker threads
+WORKERS = 4
+# frames per second of the loading screen
+LOADING_FPS = 30
+
+class Loader:
+    """
+    Runs loading jobs on a pool of worker threads while the main thread
+    draws a progress screen. Each job has a work function, that runs on a
+    worker (e.g. decoding a file), and a finish function, that runs on the
+    main thread with the work result (e.g. converting a surface to the
+    display format, which must be done by the main thread).
+    """
+    def __init__(self, workers=WORKERS):
+        """
+        Starts the worker threads
+        """
+        self.jobs = Queue.Queue()
+        self.done = Queue.Queue()
+        self.results = {}
+        self.total = 0
+        self.finished = 0
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.work)
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+
+    def work(self):
+        """
+        Worker thread main loop
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            name, work, finish = job
+            try:
+                self.done.put((name, work(), finish, None))
+            except:
+                self.done.put((name, None, finish, sys.exc_info()))
+
+    def add(self, name, work, finish=None):
+        """
+        Adds a job. work is called without arguments on a worker thread, or
+        skipped if it's None. Then finish is called with its result on the
+        main thread. The value returned by finish, or by work if finish is
+        None, is kept on results[name]. Jobs can be added by finish
+        functions while loading.
+        """
+        self.total += 1
+        if work is None:
+            self.done.put((name, None, finish, None))
+        else:
+            self.jobs.put((name, work, finish))
+
+    def poll(self, budget=None):
+        """
+        Finishes the jobs whose work is complete, returning earlier if it
+        takes more than budget seconds. Errors on workers are raised here,
+        on the main thread.
+        """
+        if budget is not None:
+            deadline = time.time() + budget
+        while budget is None or time.time() < deadline:
+            try:
+                name, result, finish, error = self.done.get_nowait()
+            except Queue.Empty:
+                return
+            if error:
+                raise error[0], error[1], error[2]
+            if finish:
+                result = finish(result)
+            self.results[name] = result
+            self.finished += 1
+
+    def get_progress(self):
+        """
+        Returns the fraction of jobs finished
+        """
+        if not self.total:
+            return 1.0
+        return float(self.finished) / self.total
+
+    def run(self, draw=None):
+        """
+        Waits until all jobs are finished, calling draw with the progress
+        after each poll. Worker threads are stopped at the end.
+        """
+        clock = pygame.time.Clock()
+        while self.finished < self.total:
+            self.poll(1.0 / LOADING_FPS)
+            if draw:
+                draw(self.get_progress())
+            # keep the window responsive while loading
+            pygame.event.pump()
+            clock.tick(LOADING_FPS)
+        for thread in self.threads:
+            self.jobs.put(None)
+        return self.results
@@ -12,53 +12,271 @@
 
 import os
 import glob
+import json
 import random
+import time
+import threading
+import Queue
 
 import pygame
 from pygame.locals import *
 
 import mutagen
 
+# event posted by the mixer when a track ends
+END_EVENT = USEREVENT + 1
+# size of the chunks read to warm a file
+WARM_CHUNK = 64 * 1024
+# library index format version, bump it when its layout changes
+INDEX_VERSION = 2
+# tags shown by the HUD, the only ones kept on the index
+HUD_TAGS = ['title', 'artist', 'album', 'date']
+
+class MusicIndex:
+    """
+    Persistent index of the music library. It keeps the mtime and tracks
+    of each directory, and the size, mtime and tags the HUD shows of each
+    track read, so a directory is listed again only when it changes and
+    tags are read again only from files that changed.
+    """
+    def __init__(self, filename=None):
+        """
+        Loads the index saved on filename, if any
+        """
+        self.filename = filename
+        self.dirs = {}
+        self.tracks = {}
+        self.dirty = False
+        if not filename:
+            return
+        try:
+            f = open(filename)
+            try:
+                index = json.load(f)
+            finally:
+                f.close()
+            if index.get("version") == INDEX_VERSION:
+                self.dirs = index["dirs"]
+                self.tracks = index["tracks"]
+        except (IOError, ValueError, KeyError):
+            pass
+
+    def scan(self, directory):
+        """
+        Returns the ogg files of directory. It's listed only if its mtime
+        changed since last scan.
+        """
+        directory = os.path.abspath(directory)
+        try:
+            mtime = os.path.getmtime(directory)
+        except OSError:
+            return []
+        cached = self.dirs.get(directory)
+        if cached and cached[0] == mtime:
+            return list(cached[1])
+        paths = glob.glob(os.path.join(directory, '*.ogg'))
+        # forget the tracks removed from the directory
+        for path in self.tracks.keys():
+            if os.path.dirname(path) == directory and path not in paths:
+                del self.tracks[path]
+        self.dirs[directory] = [mtime, paths]
+        self.dirty = True
+        return paths
+
+    def get_info(self, path):
+        """
+        Returns a dict with the HUD tags of a track, read from the file only
+        if it changed since indexed
+        """
+        st = os.stat(path)
+        track = self.tracks.get(path)
+        if track and track[0] == st.st_size and track[1] == st.st_mtime:
+            return track[2]
+        info = mutagen.File(path)
+        tags = {}
+        if info is not None:
+            for tag in HUD_TAGS:
+                try:
+                    tags[tag] = [unicode(v) for v in info[tag]]
+                except KeyError:
+                    pass
+        self.tracks[path] = [st.st_size, st.st_mtime, tags]
+        self.dirty = True
+        return tags
+
+    def save(self):
+        """
+        Writes the index, if it changed
+        """
+        if not self.filename or not self.dirty:
+            return
+        index = {"version" : INDEX_VERSION, "dirs" : self.dirs,
+                 "tracks" : self.tracks}
+        tmp = self.filename + '.tmp'
+        try:
+            f = open(tmp, 'w')
+            try:
+                json.dump(index, f)
+            finally:
+                f.close()
+            os.rename(tmp, self.filename)
+            self.dirty = False
+        except (IOError, OSError) as e:
+            print "Warning: music index couldn't be saved: %s" % e
+
 class Music_player:
+    """
+    Plays the playlist tracks. The next track is prefetched by a worker
+    thread, that reads its tags and warms its file while the current one
+    plays, so the game loop never waits for the disk. When a track ends,
+    the next one was already queued on the mixer.
+    """
     playlist = None
     loaded_index = -1
     loaded_track_info = None
 
-    def __init__(self, hud, volume=1.0, default_setlist=None, music_dir=None):
+    def __init__(self, hud, volume=1.0, default_setlist=None, music_dir=None,
+                 index_file=None):
         """
-        Initializes music playback
+        Initializes music playback. The library index is kept on
+        index_file, if given.
         """
         # Fills the playlist
+        self.index = MusicIndex(index_file)
         self.playlist = []
         if default_setlist:
-            self.playlist += glob.glob(os.path.join('music', '*.ogg'))
+            self.playlist += self.index.scan('music')
         if music_dir:
-            MUSIC_DIR = os.path.abspath(music_dir)
-            self.playlist += glob.glob(os.path.join(MUSIC_DIR, '*.ogg'))
+            self.playlist += self.index.scan(music_dir)
         # Shuffles playlist
         random.shuffle(self.playlist)
-        pygame.mixer.music.set_volume(volume)
+        # the mixer may be unavailable, e.g. running without audio device
+        self.mixer = bool(pygame.mixer.get_init())
+        if self.mixer:
+            pygame.mixer.music.set_volume(volume)
+            pygame.mixer.music.set_endevent(END_EVENT)
         # The music player need a reference to the hud to show track info
         self.hud = hud
         self.playing = False
+        # index of the track queued to play after the current one
+        self.queued_index = -1
+        # seconds spent on audio work by the main thread
+        self.main_thread_time = 0.0
+
+        # track info by index, filled by the prefetch thread
+        self.track_info = {}
+        self.prefetching = Queue.Queue()
+        self.prefetched = Queue.Queue()
+        if self.playlist:
+            thread = threading.Thread(target=self.prefetch_loop)
+            thread.setDaemon(True)
+            thread.start()
+
+    def prefetch_loop(self):
+        """
+        Prefetch thread main loop. Gets the tags from the index and reads
+        the whole file of each track requested, so the OS has it cached when
+        the mixer loads it. The index is only used by this thread.
+        """
+        self.index.save()
+        while True:
+            index = self.prefetching.get()
+            path = self.playlist[index]
+            try:
+                f = open(path, 'rb')
+                try:
+                    while f.read(WARM_CHUNK):
+                        pass
+                finally:
+                    f.close()
+                info = self.index.get_info(path)
+                self.index.save()
+            except Exception as e:
+                print "Error prefetching music %s: %s" % (path, e)
+                info = None
+            self.prefetched.put((index, info))
+
+    def prefetch(self, index):
+        """
+        Requests a track to be prefetched
+        """
+        if index not in self.track_info:
+            self.prefetching.put(index)
+
+    def get_next_index(self, index):
+        """
+        Returns the index after the given one. Wraps around if playlist
+        ended.
+        """
+        return (index + 1) % len(self.playlist)
+
+    def update(self):
+        """
+        Handles the tracks prefetched. It should be called once per frame.
+        """
+        while True:
+            try:
+                index, info = self.prefetched.get_nowait()
+            except Queue.Empty:
+                return
+            self.track_info[index] = info
+            if index == self.loaded_index:
+                # the track started before its info was ready
+                self.set_info(index)
+                if self.playing:
+                    self.hud.show_track_info()
+            elif self.playing and self.queued_index == -1 and \
+                 index == self.get_next_index(self.loaded_index):
+                self.queue(index)
+
+    def set_info(self, index):
+        """
+        Shows the info of a track on HUD, if it was prefetched
+        """
+        if index not in self.track_info:
+            return
+        self.loaded_track_info = self.track_info[index]
+        self.hud.set_track_info(self.loaded_track_info)
+
+    def queue(self, index):
+        """
+        Queues a prefetched track to play after the current one ends
+        """
+        start = time.time()
+        try:
+            pygame.mixer.music.queue(self.playlist[index])
+            self.queued_index = index
+        except pygame.error as e:
+            print "Error queueing music %s: %s" % (self.playlist[index], e)
+        self.main_thread_time += time.time() - start
 
     def load_next(self):
         """
         Loads next music in the playlist. Wraps around if playlist ended.
         """
         # if playlist is empty, don't do anything
-        if len(self.playlist) == 0:
+        if len(self.playlist) == 0 or not self.mixer:
             return
-        loading = (self.loaded_index + 1) % len(self.playlist)
+        loading = self.get_next_index(self.loaded_index)
+        start = time.time()
         try:
             pygame.mixer.music.load(self.playlist[loading])
             self.loaded_index = loading
-            self.loaded_track_info = mutagen.File(self.playlist[loading])
-            self.hud.set_track_info(self.loaded_track_info)
-            print self.loaded_track_info
+            self.queued_index = -1
+            # its info is shown when prefetched, if it wasn't yet
+            self.prefetch(loading)
+            self.set_info(loading)
         except Exception as e:
             print "Error loading music %s: %s" % (self.playlist[loading], e)
             self.loaded_index = -1
+        self.main_thread_time += time.time() - start
+
+    def set_volume(self, volume):
+        """
+        Sets the music volume, from 0.0 to 1.0
+        """
+        if self.mixer:
+            pygame.mixer.music.set_volume(volume)
 
     def play(self):
         """
@@ -68,17 +286,52 @@ class Music_player:
         if self.loaded_index == -1 or self.playing:
             return
 
+        start = time.time()
         self.hud.show_track_info()
         pygame.mixer.music.play()
         self.playing = True
+        # get the next track ready, it's queued once prefetched
+        next_index = self.get_next_index(self.loaded_index)
+        if next_index in self.track_info:
+            self.queue(next_index)
+        else:
+            self.prefetch(next_index)
+        self.main_thread_time += time.time() - start
 
     def stop(self):
         """
         Stops currently playing track
         """
         self.hud.hide_track_info()
-        pygame.mixer.music.stop()
+        if self.mixer:
+            start = time.time()
+            pygame.mixer.music.stop()
+            self.main_thread_time += time.time() - start
         self.playing = False
+        self.queued_index = -1
+
+    def track_ended(self):
+        """
+        Handles the end event of a track. If the next track was queued,
+        the mixer is already playing it.
+        """
+        if not self.playing:
+            return
+        if self.queued_index == -1:
+            # next track wasn't prefetched in time
+            self.playing = False
+            self.load_next()
+            self.play()
+            return
+        self.loaded_index = self.queued_index
+        self.queued_index = -1
+        self.set_info(self.loaded_index)
+        self.hud.show_track_info()
+        next_index = self.get_next_index(self.loaded_index)
+        if next_index in self.track_info:
+            self.queue(next_index)
+        else:
+            self.prefetch(next_index)
 
     def next_track(self):
         """
@@ -87,3 +340,9 @@ class Music_player:
         self.stop()
         self.load_next()
         self.play()
+
+    def get_main_thread_time(self):
+        """
+        Returns the seconds spent on audio work by the main thread
+        """
+        return self.main_thread_time
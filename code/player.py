@@ -12,7 +12,7 @@
 
 import math
 from actor import Actor
-from bullet import Bullet, FragmentaryBullet, GuidedBullet, EletricBullet
+from bullet import GuidedBullet, EletricBullet
 from secondary_weapon import SecondaryWeapon, MultipleShotWeapon, \
                              FragmentaryGrenade
 
@@ -20,22 +20,28 @@ class Player(Actor):
     sw_list = []
     sw_selected = -1
     max_life = 10
-    max_cooldown = cooldown = 150
+    max_cooldown = 150
+    # simulation time the primary weapon can fire again
+    ready = 0
+    # Scheduler giving the simulation time, set by the game
+    scheduler = None
     """
     Represents the player avatar.
     """
-    def __init__(self, position, rotation=0, life=10, image=None):
+    def reset(self, position, rotation=0, life=10, image=None):
         """
         Initialize object, setting position, life, xp.
         """
-        Actor.__init__(self, position, rotation, life, [0, 0], 0, image)
+        Actor.reset(self, position, rotation, life, [0, 0], 0, image)
         self.set_xp(0)
+        self.ready = 0
 
     def update(self, dt, ms, *args):
         """
         Override GameObjecte update()
         Keep the player inside the screen instead of killing it
         """
+        self.prev_rect = self.rect
         self.set_rotation(self.get_rotation() + self.get_rotation_speed())
         if self.images:
             self.image = self.images[self.rotation * len(self.images) / 360]
@@ -56,13 +62,6 @@ class Player(Actor):
         elif (self.rect.top < 0):
             self.rect.top = 0
 
-        self.cooldown += ms
-        if self.cooldown > self.max_cooldown:
-            self.cooldown = self.max_cooldown
-
-        for w in self.sw_list:
-            w.set_cooldown(w.get_cooldown() + ms)
-
     def get_xp(self):
         """
         Return experience points
@@ -88,27 +87,32 @@ class Player(Actor):
             self.life = life
         return True
 
-    def fire(self, fire_list, image, primary=True, enemy_list=None, charging=0):
+    def fire(self, fire_list, image, primary=True, charging=0,
+             guided_list=None):
         """
-        Fire a bullet if primary is True, or use secondary weapon
+        Fire a bullet if primary is True, or use secondary weapon.
+        Regular bullets are spawned on fire_list, a BulletStore, while guided
+        ones are sprites added to guided_list.
         """
+        now = self.scheduler.now
         pos = self.get_pos()
         rot = self.get_rotation()
         speed = 8
         x = speed * math.cos(math.radians(rot))
         y = speed * math.sin(math.radians(rot))
         if primary:
-            if self.cooldown == self.max_cooldown:
-                self.cooldown = 0
-                Bullet(pos, [x, y], image = image, list = fire_list)
+            if now >= self.ready:
+                self.ready = now + self.max_cooldown
+                fire_list.spawn(pos, [x, y], image)
         else:
             weapon = self.get_selected_secondary_weapon()
             # verifies if the weapon can be used. if not, cooldown
             # goes to 0 and the player will need to wait more  =)
-            if weapon.get_cooldown() >= weapon.get_warm():
-                weapon.set_cooldown(weapon.get_cooldown() - weapon.get_warm())
+            cooldown = weapon.get_cooldown(now)
+            if cooldown >= weapon.get_warm():
+                weapon.set_cooldown(cooldown - weapon.get_warm(), now)
             else:
-                weapon.set_cooldown(0)
+                weapon.set_cooldown(0, now)
                 return
             if isinstance(weapon, FragmentaryGrenade):
                 if not weapon.decrease_ammo(1):
@@ -118,9 +122,8 @@ class Player(Actor):
                 if charging < weapon.get_max_charge():
                     charge = float(charging) / weapon.get_max_charge()
                     distance *= charge
-                FragmentaryBullet(pos, [x, y], image = image, list = fire_list,
-                       distance = distance,
-                       fragments = weapon.get_fragments())
+                fire_list.spawn(pos, [x, y], image, distance = distance,
+                                fragments = weapon.get_fragments())
             elif isinstance(weapon, MultipleShotWeapon):
                 angle = weapon.get_radius()
                 bullets = weapon.get_simultaneous_shoots()
@@ -132,20 +135,20 @@ class Player(Actor):
                     b_angle = rot - angle / 2 + b * angle_dt
                     x = speed * math.cos(math.radians(b_angle))
                     y = speed * math.sin(math.radians(b_angle))
-                    Bullet(pos, [x, y], image = image, list = fire_list,
-                           distance = weapon.get_distance())
+                    fire_list.spawn(pos, [x, y], image,
+                                    distance = weapon.get_distance())
             elif weapon.type == "sw_guided":
                 if not weapon.decrease_ammo(1):
                     self.drop_secondary_weapon(weapon)
                     return
-                GuidedBullet(pos, [x, y], image = image, list = fire_list,
-                             enemy_list = enemy_list)
+                GuidedBullet.pool.acquire(pos, [x, y], rotation = rot,
+                                          image = image, list = guided_list)
             elif weapon.type == "sw_elet":
                 if not weapon.decrease_ammo(1):
                     self.drop_secondary_weapon(weapon)
                     return
-                EletricBullet(pos, [x, y], image = image, list = fire_list,
-                              enemy_list = enemy_list)
+                EletricBullet.pool.acquire(pos, [x, y], rotation = rot,
+                                           image = image, list = guided_list)
 
     def get_powerup(self, type, special):
         """
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+class Pool:
+    """
+    Free list of game objects of a single class. Killed objects are sent
+    back to their pool and reset in place when acquired again, so dense
+    waves don't create and throw away lots of sprites.
+    """
+    def __init__(self, cls):
+        """
+        Creates an empty pool of instances of cls
+        """
+        self.cls = cls
+        self.free = []
+        self.in_use = 0
+        self.high_water = 0
+        self.created = 0
+        self.reused = 0
+
+    def prewarm(self, size, *args, **kwargs):
+        """
+        Creates objects until the pool has size free ones. args are
+        the constructor arguments, they will be replaced on acquire.
+        """
+        while len(self.free) < size:
+            obj = self.cls(*args, **kwargs)
+            self.created += 1
+            obj.pool = self
+            obj.in_pool = True
+            self.free.append(obj)
+
+    def acquire(self, *args, **kwargs):
+        """
+        Returns an object built with the same arguments the class
+        constructor takes. Free objects are reused if available.
+        """
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            self.reused += 1
+        else:
+            obj = self.cls(*args, **kwargs)
+            self.created += 1
+        obj.pool = self
+        obj.in_pool = False
+        self.in_use += 1
+        if self.in_use > self.high_water:
+            self.high_water = self.in_use
+        return obj
+
+    def release(self, obj):
+        """
+        Sends an object back to the pool. Releasing it twice, or releasing
+        an instance of a subclass, does nothing.
+        """
+        if obj.in_pool or obj.__class__ is not self.cls:
+            return
+        obj.in_pool = True
+        self.in_use -= 1
+        self.free.append(obj)
+
+    def get_stats(self):
+        """
+        Returns a dict with objects in use, free, created and reused, and
+        the high-water mark of objects in use.
+        """
+        return {"in_use" : self.in_use,
+                "free" : len(self.free),
+                "created" : self.created,
+                "reused" : self.reused,
+                "high_water" : self.high_water}
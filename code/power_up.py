@@ -16,29 +16,40 @@ class PowerUp(GameObject):
     """
     Base class for all power-ups
     """
-    def __init__(self, position, life_time=3000, speed=[0,0], type=None,
-                 pu_attr=0, image=None):
+    # timer killing the power-up when its life time ends
+    expiry = None
+
+    def reset(self, position, life_time=3000, speed=[0,0], type=None,
+              pu_attr=0, image=None):
         """
         Set position, speed, life time and image
         """
-        GameObject.__init__(self, image, position, 0, speed, 0)
+        GameObject.reset(self, image, position, 0, speed, 0)
         self.type = type
         self.pu_attr = pu_attr
         self.set_life_time(life_time)
 
-    def update(self, dt, ms, *args):
+    def schedule(self, scheduler):
+        """
+        Starts counting the life time, the power-up is killed when it ends
+        """
+        self.expiry = scheduler.schedule(self.life_time, self.kill)
+
+    def kill(self):
         """
-        Overrides GameObject update
+        Stops the life time and removes the power-up
         """
-        self.set_life_time(self.get_life_time() - ms)
-        if self.get_life_time() < 0:
-            self.kill()
-        GameObject.update(self, dt, ms)
+        if self.expiry is not None:
+            self.expiry.cancel()
+            self.expiry = None
+        GameObject.kill(self)
 
     def get_life_time(self):
         """
         Return how much time the object will remains alive
         """
+        if self.expiry is not None:
+            return self.expiry.get_remaining()
         return self.life_time
 
     def set_life_time(self, life_time):
@@ -11,73 +11,260 @@
 # ----------------------------------------------------------------------
 
 import ConfigParser
-import os, re
+import cPickle
+import os
 import shutil
+import time
+
+# snapshot format version, bump it when the schema changes
+VERSION = 1
+# seconds between checks for changes on the preferences file
+POLL_INTERVAL = 1.0
+
+def resolution(value):
+    """
+    Converts a resolution as 800x600 to a list of width and height
+    """
+    w, h = value.split("x")
+    return [int(w), int(h)]
+
+def boolean(value):
+    """
+    Options are disabled by leaving them blank
+    """
+    return bool(value.strip())
+
+# type and default value of each preference, by section
+SCHEMA = [
+    ("screen", [
+        ("resolution", resolution, "800x600"),
+        ("fullscreen", boolean, ""),
+        ("dirty_rects", boolean, ""),
+        ("max_fps", int, "60"),
+    ]),
+    ("graphics", [
+        ("rotation_frames", int, "72"),
+        ("rotation_cache", boolean, "True"),
+    ]),
+    ("joystick", [
+        ("id", int, "0"),
+        ("axis_x", int, "0"),
+        ("axis_y", int, "1"),
+        ("axis_z", int, "3"),
+        ("fire", int, "5"),
+        ("secondary_fire", int, "4"),
+        ("prev_secondary_weapon", int, "6"),
+        ("next_secondary_weapon", int, "7"),
+        ("rot_clock", int, "0"),
+        ("rot_anti_clock", int, "1"),
+        ("player_play", int, "2"),
+        ("player_stop", int, "3"),
+        ("player_next_track", int, "8"),
+        ("sensitivity", float, "5"),
+        ("deadzone", float, "0.2"),
+    ]),
+    ("keyboard", [
+        ("up", int, "273"),
+        ("down", int, "274"),
+        ("right", int, "275"),
+        ("left", int, "276"),
+        ("player_play", int, "118"),
+        ("player_stop", int, "98"),
+        ("player_next_track", int, "110"),
+        ("rot_clock", int, "113"),
+        ("rot_anti_clock", int, "119"),
+        ("fire", int, "32"),
+        ("prev_secondary_weapon", int, "97"),
+        ("next_secondary_weapon", int, "115"),
+        ("secondary_fire", int, "100"),
+        ("toogle_fullscreen", int, "102"),
+        ("toogle_profiler", int, "284"),
+    ]),
+    ("mouse", [
+        ("fire", int, "1"),
+        ("secondary_fire", int, "3"),
+        ("prev_secondary_weapon", int, "4"),
+        ("next_secondary_weapon", int, "5"),
+        ("sensitivity", float, "0.6"),
+    ]),
+    ("pool", [
+        ("enemies", int, "64"),
+        ("powerups", int, "8"),
+        ("guided_bullets", int, "16"),
+    ]),
+    ("debug", [
+        ("profile_frames", int, "3600"),
+    ]),
+    ("general", [
+        ("input", str, "mouse"),
+        ("music_volume", float, "0.8"),
+        ("use_default_setlist", boolean, "True"),
+        ("music_dir", str, ""),
+    ]),
+]
+
+# type and default value of each attribute, as section_item
+FIELDS = {}
+for section, fields in SCHEMA:
+    for item, type, default in fields:
+        FIELDS["%s_%s" % (section, item)] = (type, default)
 
 class Preferences(object):
-    def __init__(self, filename, default_filename):
-        self.conf = ConfigParser.ConfigParser()
-        self.default_conf = ConfigParser.ConfigParser()
-        try:
-            self.default_conf.read(default_filename)
-        except ConfigParser.Error:
-            # if default preferences can't be find it should exit
-            print "Error: Couldn't find default preferences file"
-            exit(2)
+    """
+    Preferences read from the user file over the default one. Each item
+    becomes an attribute named by its section and name, converted to the
+    type declared on SCHEMA, example:
+      [keyboard]
+        up = 273
+    turns into self.keyboard_up = 273.
+    The parsed values are kept on a snapshot, used while the files don't
+    change, so starting the game doesn't parse them again.
+    """
+    def __init__(self, filename, default_filename, cache_file=None):
+        self.filename = filename
+        self.default_filename = default_filename
+        self.cache_file = cache_file
+        self.stamp = None
+        self.last_poll = time.time()
         if not os.path.isfile(filename):
-            self.copy_default(default_filename, filename)
-        try:
-            self.conf.read(filename)
-        except ConfigParser.Error:
-            try:
-                os.rename(filename, filename+'.backup')
-            except OSError:
-                print "Warning: Not creating preferences backup file"
-            self.copy_default(default_filename, filename)
+            self.copy_default()
+        self.load()
 
-        # autogenerate the attributes for each item on the config file.
-        self.autogen_attributes()
-
-    def copy_default(self, default_filename, filename):
+    def copy_default(self):
+        """
+        Creates the user file from the default one
+        """
         try:
-            shutil.copy(default_filename, filename)
-            self.__init__(filename, default_filename)
+            shutil.copy(self.default_filename, self.filename)
         except IOError:
             print "Warning: preferences file couldn't be created"
 
-    def parse_config_item(self, value):
+    def get_stamp(self):
         """
-        Gather the type we're dealing with and return the value
-        on its real type.
+        Returns the mtime and size of both files, None for a missing one
         """
-        resolution_type = lambda s: [ int(s.split("x")[0]),
-                                      int(s.split("x")[1]) ]
+        stamp = []
+        for filename in (self.default_filename, self.filename):
+            try:
+                st = os.stat(filename)
+                stamp.append((st.st_mtime, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return stamp
 
-        patterns = [ [resolution_type, re.compile("[0-9]+x[0-9]+")],
-                     [float, re.compile("[0-9]+\.[0-9]+")],
-                     [int, re.compile("[0-9]+")],
-                     [str, re.compile(".*")] ]
+    def load(self, reloading=False):
+        """
+        Sets the attributes from the snapshot, or parsing the files if they
+        changed since it was saved. When reloading, files that can't be
+        parsed leave the attributes as they are.
+        """
+        stamp = self.get_stamp()
+        values = self.load_snapshot(stamp)
+        if values is None:
+            values = self.parse(reloading)
+            if values is not None:
+                self.save_snapshot(stamp, values)
+        if values is not None:
+            self.__dict__.update(values)
+        # a broken file is tried again only when it changes
+        self.stamp = stamp
 
-        for ty, regex in patterns:
-            if regex.match(value):
-                return ty(value)
+    def load_snapshot(self, stamp):
+        """
+        Returns the values of the snapshot, or None if there's no snapshot
+        of files with the given stamp
+        """
+        if not self.cache_file:
+            return None
+        try:
+            f = open(self.cache_file, 'rb')
+            try:
+                version, cached_stamp, values = cPickle.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            return None
+        if version != VERSION or cached_stamp != stamp:
+            return None
+        return values
 
-    def autogen_attributes(self):
+    def save_snapshot(self, stamp, values):
         """
-        Get tuples from ConfigParser and autogenerate attributes
-        based on the section and preference name, example:
-          [keyboard]
-            up = 273
-            down = ...
-        This should turn into:
-          self.keyboard_up = 273
-          self.keyboard_down = ...
+        Saves the parsed values, if there's a cache file
         """
-        for conf in [self.default_conf, self.conf]:
+        if not self.cache_file:
+            return
+        try:
+            f = open(self.cache_file, 'wb')
+            try:
+                cPickle.dump((VERSION, stamp, values), f,
+                             cPickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+        except IOError:
+            # it will be parsed again next time
+            pass
+
+    def parse(self, reloading=False):
+        """
+        Reads both files, returning a dict with the value of each attribute.
+        When reloading, a file that can't be parsed is being edited, so
+        it's left alone and None is returned.
+        """
+        default_conf = ConfigParser.ConfigParser()
+        conf = ConfigParser.ConfigParser()
+        try:
+            default_conf.read(self.default_filename)
+        except ConfigParser.Error:
+            if reloading:
+                print "Warning: default preferences file couldn't be " \
+                      "read, keeping the current preferences"
+                return None
+            # if default preferences can't be find it should exit
+            print "Error: Couldn't find default preferences file"
+            exit(2)
+        try:
+            conf.read(self.filename)
+        except ConfigParser.Error:
+            if reloading:
+                print "Warning: preferences file couldn't be read, " \
+                      "keeping the current preferences"
+                return None
+            try:
+                os.rename(self.filename, self.filename + '.backup')
+            except OSError:
+                print "Warning: Not creating preferences backup file"
+            self.copy_default()
+            conf = default_conf
+
+        values = {}
+        for attr_name, (type, default) in FIELDS.items():
+            values[attr_name] = type(default)
+        for conf in [default_conf, conf]:
             for section in conf.sections():
                 for item, value in conf.items(section):
-                    attr_name   = "%s_%s" % (section, item)
-                    attr_value  = self.parse_config_item(value)
-                    self.__setattr__(attr_name, attr_value)
-                    print section, item, attr_value
+                    attr_name = "%s_%s" % (section, item)
+                    if attr_name not in FIELDS:
+                        # unknown items are kept as text
+                        values[attr_name] = value
+                        continue
+                    try:
+                        values[attr_name] = FIELDS[attr_name][0](value)
+                    except ValueError:
+                        print "Warning: invalid value for %s on [%s]: %s" % \
+                            (item, section, value)
+        return values
 
+    def poll(self):
+        """
+        Loads the preferences again if the files changed, checking them at
+        most every POLL_INTERVAL seconds. Returns True if they were loaded.
+        """
+        now = time.time()
+        if now - self.last_poll < POLL_INTERVAL:
+            return False
+        self.last_poll = now
+        if self.get_stamp() == self.stamp:
+            return False
+        self.load(True)
+        return True
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import csv
+import json
+# the most precise clock of the platform
+from timeit import default_timer as timer
+import pygame
+
+# phases of a frame, in the order they run
+PHASES = ["events", "update", "act", "elements", "draw", "flip"]
+# number of frames kept
+HISTORY = 3600
+# time between overlay renders, in ms
+OVERLAY_REFRESH = 500
+OVERLAY_COLOR = (255, 255, 0)
+OVERLAY_BACKGROUND = (0, 0, 0)
+
+def percentile(values, p):
+    """
+    Returns the p percentile of values, by the nearest rank
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+class FrameProfiler:
+    """
+    Times each phase of the frames and counts the elements of each group,
+    keeping the last frames on a ring buffer. Lists are allocated once, so
+    profiling a frame costs just a few clock reads.
+    """
+    def __init__(self, groups, size=HISTORY):
+        """
+        groups is a dict of name: group, as Game.actors_list
+        """
+        self.groups = groups
+        self.names = sorted(groups)
+        self.size = size
+        self.times = dict((phase, [0.0] * size) for phase in PHASES)
+        self.counts = dict((name, [0] * size) for name in self.names)
+        self.frames = [0] * size
+        # work timed by clocks of its own, see add_clock
+        self.clocks = []
+        self.index = 0
+        self.length = 0
+        self.frame = 0
+        self.last = timer()
+
+    def add_clock(self, name, clock):
+        """
+        Times name on each frame too. clock is a function returning the
+        seconds spent on it so far, for work done inside the phases, as
+        the audio of the main thread.
+        """
+        self.times[name] = [0.0] * self.size
+        self.clocks.append([name, clock, clock()])
+
+    def get_timed(self):
+        """
+        Returns the phases and the names of the clocks, as timed
+        """
+        return PHASES + [clock[0] for clock in self.clocks]
+
+    def begin(self, frame):
+        """
+        Starts timing frame
+        """
+        self.frame = frame
+        i = self.index
+        for phase in PHASES:
+            self.times[phase][i] = 0.0
+        self.last = timer()
+
+    def mark(self, phase):
+        """
+        Ends phase, that took the time since the last mark. A phase may run
+        many times on a frame, as the simulation steps, and its times add.
+        """
+        now = timer()
+        self.times[phase][self.index] += now - self.last
+        self.last = now
+
+    def end(self):
+        """
+        Ends the frame, counting the elements of the groups and reading
+        the clocks
+        """
+        i = self.index
+        self.frames[i] = self.frame
+        for clock in self.clocks:
+            name, read, last = clock
+            clock[2] = read()
+            self.times[name][i] = clock[2] - last
+        for name in self.names:
+            self.counts[name][i] = len(self.groups[name])
+        self.index = (i + 1) % self.size
+        self.length = min(self.length + 1, self.size)
+
+    def get_slots(self):
+        """
+        Returns the slots of the buffer in use, from the oldest frame
+        """
+        start = (self.index - self.length) % self.size
+        return [(start + i) % self.size for i in range(self.length)]
+
+    def get_stats(self):
+        """
+        Returns a dict with the p50 and p99 of each phase and clock, in ms
+        """
+        slots = self.get_slots()
+        stats = {}
+        for phase in self.get_timed():
+            times = self.times[phase]
+            values = [times[i] * 1000 for i in slots]
+            stats[phase] = (percentile(values, 50), percentile(values, 99))
+        return stats
+
+    def get_counts(self):
+        """
+        Returns a dict with the elements of each group on the last frame
+        """
+        last = (self.index - 1) % self.size
+        return dict((name, self.counts[name][last]) for name in self.names)
+
+    def get_rows(self):
+        """
+        Returns a list of rows with frame number, time of each phase and
+        clock in ms and count of each group, from the oldest frame
+        """
+        timed = self.get_timed()
+        rows = []
+        for i in self.get_slots():
+            row = [self.frames[i]]
+            row += [self.times[phase][i] * 1000 for phase in timed]
+            row += [self.counts[name][i] for name in self.names]
+            rows.append(row)
+        return rows
+
+    def dump(self, filename):
+        """
+        Writes the frames kept to filename, as JSON if its extension is
+        .json, or as CSV otherwise
+        """
+        header = ["frame"] + self.get_timed() + self.names
+        f = open(filename, 'wb')
+        try:
+            if filename.endswith(".json"):
+                json.dump({"columns" : header, "frames" : self.get_rows()}, f)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(self.get_rows())
+        finally:
+            f.close()
+
+class ProfilerOverlay:
+    """
+    Shows the profiler stats over the game. The text is rendered again only
+    every OVERLAY_REFRESH ms, so it barely changes the timings it shows.
+    """
+    visible = False
+    image = None
+
+    def __init__(self, profiler, pos=None):
+        self.profiler = profiler
+        self.pos = pos or [10, 10]
+        self.font = pygame.font.SysFont('verdana', 12)
+        self.last_render = 0
+
+    def toggle(self):
+        """
+        Shows the overlay if hidden, hides it otherwise
+        """
+        self.visible = not self.visible
+        self.image = None
+
+    def render(self):
+        """
+        Renders the stats to a single surface
+        """
+        stats = self.profiler.get_stats()
+        lines = ["%-8s p50 %6.2f  p99 %6.2f ms" % ((phase,) + stats[phase])
+                 for phase in self.profiler.get_timed()]
+        counts = self.profiler.get_counts()
+        lines += ["%-12s %5d" % (name, counts[name])
+                  for name in self.profiler.names]
+        images = [self.font.render(line, False, OVERLAY_COLOR,
+                                   OVERLAY_BACKGROUND) for line in lines]
+        w = max(image.get_width() for image in images)
+        h = self.font.get_linesize()
+        self.image = pygame.Surface((w, h * len(images))).convert()
+        self.image.fill(OVERLAY_BACKGROUND)
+        for i, image in enumerate(images):
+            self.image.blit(image, (0, i * h))
+
+    def draw(self, screen):
+        """
+        Draws the overlay if visible. Returns the list of rects drawn.
+        """
+        if not self.visible:
+            return []
+        now = pygame.time.get_ticks()
+        if self.image is None or now - self.last_render > OVERLAY_REFRESH:
+            self.last_render = now
+            self.render()
+        return [screen.blit(self.image, self.pos)]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import pygame
+from pygame.locals import *
+
+def merge_rects(rects):
+    """
+    Merge overlapping rects, so each screen area is updated only once
+    """
+    merged = []
+    for rect in rects:
+        rect = Rect(rect)
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def interpolate(groups, alpha):
+    """
+    Moves the sprites of groups to alpha of the way from their rect before
+    the last update to the current one, for drawing. Groups that can
+    interpolate by themselves, as BulletStores, are just told to.
+    Returns the list of sprites moved with their rects, to put them back
+    with restore() after drawing.
+    """
+    moved = []
+    beta = 1.0 - alpha
+    for group in groups:
+        if hasattr(group, "interpolate"):
+            group.interpolate(alpha)
+            continue
+        for sprite in group.sprites():
+            rect = sprite.rect
+            prev = sprite.prev_rect
+            if prev is rect or prev == rect:
+                continue
+            moved.append((sprite, rect))
+            sprite.rect = rect.move(int(round((prev.x - rect.x) * beta)),
+                                    int(round((prev.y - rect.y) * beta)))
+    return moved
+
+def restore(moved):
+    """
+    Puts back the sprites moved by interpolate()
+    """
+    for sprite, rect in moved:
+        sprite.rect = rect
+
+class DirtyRenderer:
+    """
+    Draws only what changed since the last frame and updates just these
+    areas of the display, instead of drawing everything and flipping the
+    whole screen.
+    Sprites are erased by redrawing the background over their last rects,
+    the scrolling layer of the background is handled as a region of its own.
+    """
+    def __init__(self, screen, background, hud, groups):
+        """
+        groups is a list of the sprite groups (or BulletStores) to be drawn.
+        They must return the changed rects from draw(), as RenderUpdates.
+        """
+        self.screen = screen
+        self.background = background
+        self.hud = hud
+        self.groups = groups
+        # drawn over the HUD, as the HUD they return the rects drawn
+        self.overlays = []
+        self.hud_rects = []
+        self.invalidate()
+
+    def add_overlay(self, overlay):
+        """
+        Adds an element drawn over everything, like a debug overlay
+        """
+        self.overlays.append(overlay)
+
+    def invalidate(self):
+        """
+        Forces the whole screen to be drawn on next frame
+        """
+        self.full_redraw = True
+
+    def draw_top(self, screen):
+        """
+        Draws HUD and overlays, keeping their rects to erase them later
+        """
+        self.hud_rects = self.hud.draw(screen)
+        for overlay in self.overlays:
+            self.hud_rects += overlay.draw(screen)
+        return self.hud_rects
+
+    def render(self):
+        """
+        Draws the frame to the screen surface. Returns the list of rects
+        to be updated on display, or None if it must be flipped.
+        """
+        screen = self.screen
+        if self.full_redraw:
+            self.full_redraw = False
+            self.background.draw(screen)
+            for group in self.groups:
+                group.draw(screen)
+            self.draw_top(screen)
+            return None
+
+        clear = self.background.clear
+        # erase sprites and HUD from their last position
+        for group in self.groups:
+            group.clear(screen, clear)
+        for rect in self.hud_rects:
+            clear(screen, rect)
+        rects = list(self.hud_rects)
+
+        rects += self.background.draw_dirty(screen)
+        for group in self.groups:
+            rects += group.draw(screen)
+        # draw the hud after all the actors, so it will be at the top
+        rects += self.draw_top(screen)
+        return merge_rects(rects)
+
+    def present(self, rects):
+        """
+        Updates the display areas returned by render
+        """
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def draw(self):
+        """
+        Draws the frame and updates the display
+        """
+        self.present(self.render())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import cPickle
+import gzip
+import pygame
+from pygame.locals import *
+
+# recording format version, bump it when frames change
+VERSION = 1
+# input events, kept on recordings. Others, as the music end event, come
+# from the live queue even when replaying.
+RECORDED_EVENTS = [KEYDOWN, KEYUP, MOUSEMOTION, MOUSEBUTTONUP,
+                   MOUSEBUTTONDOWN, JOYAXISMOTION, JOYBALLMOTION,
+                   JOYHATMOTION, JOYBUTTONUP, JOYBUTTONDOWN, QUIT]
+
+class Recorder:
+    """
+    Writes the input of each frame, with the time it took, to a gzipped
+    file. With the seed of the game, that's all needed to play the same
+    frames again.
+    """
+    def __init__(self, filename, seed):
+        self.file = gzip.open(filename, 'wb')
+        cPickle.dump((VERSION, seed), self.file, cPickle.HIGHEST_PROTOCOL)
+
+    def record(self, ms, events):
+        """
+        Writes a frame, that took ms, with its input events
+        """
+        frame = (ms, [(event.type, event.dict) for event in events
+                      if event.type in RECORDED_EVENTS])
+        cPickle.dump(frame, self.file, cPickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self.file.close()
+
+class Replay:
+    """
+    Reads frames written by a Recorder
+    """
+    def __init__(self, filename):
+        """
+        Opens the recording and reads its seed. Raises ValueError if it was
+        written by an incompatible version.
+        """
+        self.file = gzip.open(filename, 'rb')
+        version, self.seed = cPickle.load(self.file)
+        if version != VERSION:
+            self.file.close()
+            raise ValueError("recording version %d, expected %d" %
+                             (version, VERSION))
+
+    def next(self):
+        """
+        Returns the time and the list of input events of the next frame,
+        or None at the end of the recording
+        """
+        try:
+            ms, events = cPickle.load(self.file)
+        except EOFError:
+            return None
+        return ms, [pygame.event.Event(type, attributes)
+                    for type, attributes in events]
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import math
+import os
+import pygame
+from pygame.locals import *
+
+class RotationCache(list):
+    """
+    List of frames of an image rotated over the whole circle, built once at
+    load time, so a frame for any angle is found without rotating anything
+    while the game runs. Frame i is rotated i * 360 / len(frames) degrees
+    clockwise, as angles grow clockwise on screen.
+    All the frames have the same size, so rects don't change when rotating.
+    It's a list, so it can be used anywhere a list of images is expected.
+    """
+    def __init__(self, image, frames, cache_file=None, source=None):
+        """
+        Creates frames rotated images of image, a surface with per pixel
+        alpha. If cache_file is given, frames are read from it if it's
+        newer than the source file, or it's written after rotating.
+        """
+        list.__init__(self)
+        w, h = image.get_size()
+        # all the rotations fit in a square of the image diagonal
+        self.cell = int(math.ceil(math.hypot(w, h)))
+        if cache_file and self.load(cache_file, frames, source):
+            return
+        for i in range(frames):
+            rotated = pygame.transform.rotozoom(image, -i * 360.0 / frames, 1)
+            frame = pygame.Surface((self.cell, self.cell), SRCALPHA)
+            frame.blit(rotated,
+                       rotated.get_rect(center=frame.get_rect().center))
+            self.append(frame.convert_alpha())
+        if cache_file:
+            self.save(cache_file)
+
+    def get(self, angle):
+        """
+        Returns the frame nearest to angle, in degrees
+        """
+        n = len(self)
+        return self[int(round(angle * n / 360.0)) % n]
+
+    def load(self, cache_file, frames, source=None):
+        """
+        Reads the frames from a strip saved on disk. Returns False if it
+        doesn't exist, it's older than source or it doesn't match.
+        """
+        try:
+            if source and os.path.getmtime(cache_file) < \
+               os.path.getmtime(source):
+                return False
+            strip = pygame.image.load(cache_file).convert_alpha()
+        except (OSError, pygame.error):
+            return False
+        if strip.get_size() != (self.cell * frames, self.cell):
+            return False
+        for i in range(frames):
+            self.append(strip.subsurface((i * self.cell, 0,
+                                          self.cell, self.cell)))
+        return True
+
+    def save(self, cache_file):
+        """
+        Writes all the frames to disk as a single strip
+        """
+        strip = pygame.Surface((self.cell * len(self), self.cell), SRCALPHA)
+        for i, frame in enumerate(self):
+            strip.blit(frame, (i * self.cell, 0))
+        try:
+            pygame.image.save(strip, cache_file)
+        except pygame.error, e:
+            print "Warning: rotation cache couldn't be saved: %s" % e
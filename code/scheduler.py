@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import heapq
+
+class Timer:
+    """
+    A callback scheduled on a Scheduler. Repeating timers are scheduled
+    again after each call.
+    """
+    def __init__(self, scheduler, time, callback, args, period=0, jitter=0):
+        self.scheduler = scheduler
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.period = period
+        self.jitter = jitter
+        self.active = True
+
+    def cancel(self):
+        """
+        Stops the timer, it won't be called anymore
+        """
+        self.active = False
+
+    def get_remaining(self):
+        """
+        Returns the time left until the next call, in ms
+        """
+        return self.time - self.scheduler.now
+
+class Scheduler:
+    """
+    Calls timers when the simulation time reaches them. Timers are kept on
+    a heap by the time they are due, so a tick costs only the timers it
+    calls, not the objects that have some. Canceled timers are just marked,
+    and dropped when they get to the top of the heap.
+    """
+    def __init__(self, random):
+        """
+        random is the generator of the jitter, so a seeded game schedules
+        the same way on every run
+        """
+        self.random = random
+        self.now = 0
+        self.heap = []
+        # breaks ties in the order timers were scheduled
+        self.sequence = 0
+
+    def push(self, timer):
+        """
+        Puts timer on the heap
+        """
+        heapq.heappush(self.heap, (timer.time, self.sequence, timer))
+        self.sequence += 1
+
+    def get_interval(self, period, jitter):
+        """
+        Returns period changed by up to jitter ms, to either side
+        """
+        if jitter:
+            period += self.random.randint(-jitter, jitter)
+        return max(period, 1)
+
+    def schedule(self, delay, callback, *args):
+        """
+        Calls callback with args after delay ms. Returns the timer.
+        """
+        timer = Timer(self, self.now + delay, callback, args)
+        self.push(timer)
+        return timer
+
+    def repeat(self, period, jitter, callback, *args):
+        """
+        Calls callback with args every period ms, each interval changed by
+        up to jitter ms. Returns the timer.
+        """
+        timer = Timer(self, self.now + self.get_interval(period, jitter),
+                      callback, args, period, jitter)
+        self.push(timer)
+        return timer
+
+    def advance(self, ms):
+        """
+        Moves the time ms forward, calling the timers due, in order
+        """
+        self.now += ms
+        heap = self.heap
+        while heap and heap[0][0] <= self.now:
+            timer = heapq.heappop(heap)[2]
+            if not timer.active:
+                continue
+            if timer.period:
+                # counted from when it was due, so it doesn't drift
+                timer.time += self.get_interval(timer.period, timer.jitter)
+                self.push(timer)
+            else:
+                timer.active = False
+            timer.callback(*timer.args)
+
+    def __len__(self):
+        """
+        Returns the number of timers on the heap, canceled ones included
+        """
+        return len(self.heap)
@@ -20,6 +20,8 @@ class SecondaryWeapon:
         self.distance = int(attributes['distance'])
         self.max_cooldown = int(attributes['cooldown'])
         self.cooldown = self.max_cooldown
+        # time the cooldown was set, it grows from there
+        self.stamp = 0
         self.warm = int(attributes['heating'])
         self.max_charge = int(attributes['max_charge'])
 
@@ -38,16 +40,28 @@ class SecondaryWeapon:
     def get_distance(self):
         return self.distance
 
-    def get_cooldown(self):
-        return self.cooldown
+    def get_cooldown(self, now):
+        """
+        Returns the cooldown at the simulation time now. It grows with the
+        time, up to the max, so it's computed when needed instead of being
+        updated on every tick.
+        """
+        cooldown = self.cooldown + now - self.stamp
+        if cooldown > self.max_cooldown:
+            return self.max_cooldown
+        return cooldown
 
-    def set_cooldown(self, time):
+    def set_cooldown(self, time, now):
+        """
+        Sets the cooldown at the simulation time now
+        """
         if time > self.max_cooldown:
             self.cooldown = self.max_cooldown
         elif time < 0:
             self.cooldown = 0
         else:
             self.cooldown = time
+        self.stamp = now
 
     def get_warm(self):
         return self.warm
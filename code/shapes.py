@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import math
+import pygame
+from pygame.locals import *
+
+class Shape:
+    """
+    Collision shape of the elements drawn with an image, tested after their
+    rects collide. Masks are built the first time an image is tested and
+    kept, so no mask is created while the game runs.
+    """
+    def __init__(self):
+        self.masks = {}
+
+    def get_key(self, image):
+        """
+        Returns the key the mask of image is kept by
+        """
+        return image
+
+    def get_mask(self, image):
+        """
+        Returns the mask of the shape over the rect of image
+        """
+        key = self.get_key(image)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = self.build_mask(image)
+        return mask
+
+    def prepare(self, images):
+        """
+        Builds the masks of the given images, so they are ready before the
+        game starts
+        """
+        for image in images:
+            self.get_mask(image)
+
+    def build_mask(self, image):
+        """
+        Returns a new mask of the shape over image
+        """
+        return pygame.mask.from_surface(image)
+
+class Pixels(Shape):
+    """
+    The opaque pixels of the image, for irregular images and rotated frames,
+    whose rects are mostly empty
+    """
+
+class Circle(Shape):
+    """
+    A circle centered on the image, with a diameter of ratio times its
+    smallest side. Two circles are tested without masks.
+    """
+    def __init__(self, ratio=1.0):
+        Shape.__init__(self)
+        self.ratio = ratio
+
+    def get_key(self, image):
+        """
+        Images of the same size have the same circle
+        """
+        return image.get_size()
+
+    def get_radius(self, image):
+        """
+        Returns the radius of the circle over image
+        """
+        return self.ratio * min(image.get_size()) / 2.0
+
+    def build_mask(self, image):
+        w, h = image.get_size()
+        surface = pygame.Surface((w, h), SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        radius = int(math.ceil(self.get_radius(image)))
+        pygame.draw.circle(surface, (255, 255, 255, 255), (w / 2, h / 2),
+                           max(radius, 1))
+        return pygame.mask.from_surface(surface)
+
+class Box(Shape):
+    """
+    The rect of the image shrunk to ratio of its size, around the same
+    center. Two boxes are tested without masks.
+    """
+    def __init__(self, ratio=1.0):
+        Shape.__init__(self)
+        self.ratio = ratio
+
+    def get_key(self, image):
+        """
+        Images of the same size have the same box
+        """
+        return image.get_size()
+
+    def get_box(self, rect):
+        """
+        Returns the box of an element with rect
+        """
+        return rect.inflate(-int(rect.width * (1 - self.ratio)),
+                            -int(rect.height * (1 - self.ratio)))
+
+    def build_mask(self, image):
+        surface = pygame.Surface(image.get_size(), SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        box = self.get_box(surface.get_rect())
+        surface.fill((255, 255, 255, 255), box)
+        return pygame.mask.from_surface(surface)
+
+# shape of the elements of each group of Game.actors_list. Enemy bullets
+# are round, and the player frames are rotated, so their rects are mostly
+# empty.
+SHAPES = {
+    "player" : (Pixels, ()),
+    "enemies" : (Box, (0.8,)),
+    "enemies_fire" : (Circle, (0.8,)),
+    "fire" : (Circle, (1.0,)),
+    "guided_fire" : (Circle, (1.0,)),
+    "powerups" : (Box, (1.0,)),
+}
+
+def make_shapes(shapes=SHAPES):
+    """
+    Returns a dict with a new shape for each group, with empty caches
+    """
+    return dict((name, cls(*args)) for name, (cls, args) in shapes.items())
+
+def collide(shape_a, rect_a, image_a, shape_b, rect_b, image_b):
+    """
+    Returns True if the shapes of two elements overlap. It's the narrow
+    phase, their rects should already collide.
+    """
+    if isinstance(shape_a, Circle) and isinstance(shape_b, Circle):
+        distance = shape_a.get_radius(image_a) + shape_b.get_radius(image_b)
+        dx = rect_a.centerx - rect_b.centerx
+        dy = rect_a.centery - rect_b.centery
+        return dx * dx + dy * dy <= distance * distance
+    if isinstance(shape_a, Box) and isinstance(shape_b, Box):
+        return shape_a.get_box(rect_a).colliderect(shape_b.get_box(rect_b))
+    # masks are aligned by the top left of the images, as rects
+    offset = (rect_b.left - rect_a.left, rect_b.top - rect_a.top)
+    mask_a = shape_a.get_mask(image_a)
+    return mask_a.overlap(shape_b.get_mask(image_b), offset) is not None
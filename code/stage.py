@@ -11,109 +11,292 @@
 # Released under GNU GPL, read the file 'COPYING' for more information
 # ----------------------------------------------------------------------
 
-import xml
-import xml.dom
-import xml.dom.minidom
+import bisect
+import cPickle
+import hashlib
+import heapq
+import os
+import xml.etree.cElementTree as ElementTree
 
-class Callable:
-    def __init__(self, anycallable):
-        self.__call__ = anycallable
+# compiled stage format version, bump it when items change
+VERSION = 1
+# suffix of the compiled stage, saved next to the source
+CACHE_SUFFIX = ".cache"
+# tags holding numbers
+INT_TAGS = ['cc', 'pos_x', 'pos_y', 'life', 'speed', 'speed_x', 'speed_y',
+            'time', 'layer', 'zigzag', 'seek']
+# stage files bigger than that, in bytes, are streamed instead of compiled
+STREAMING_SIZE = 1024 * 1024
+# frames ahead of the current one kept in memory when streaming
+STREAMING_WINDOW = 600
 
 class Item:
-    def __init__(self, node):
-        for tag in ['type', 'cc']:
-            setattr(self, tag, self.get_element(tag, node))
+    """
+    An event of the stage timeline. tags are set as attributes, numbers
+    already converted, and pu_tags are kept as strings in pu_attr.
+    Optional tags have their text in defaults, used when they are missing.
+    """
+    tags = ['type', 'cc']
+    pu_tags = []
+    defaults = {}
 
-    def get_element(self, tag, node):
-        return node.getElementsByTagName(tag)[0].childNodes[0].nodeValue
+    def __init__(self, values):
+        """
+        Creates an item from a dict of tag: text
+        """
+        for tag in self.tags:
+            if tag in values:
+                value = values[tag]
+            else:
+                value = self.defaults[tag]
+            if tag in INT_TAGS:
+                value = int(value)
+            setattr(self, tag, value)
+        if self.pu_tags:
+            self.pu_attr = {}
+            for tag in self.pu_tags:
+                self.pu_attr[tag] = values[tag]
 
 class Backg(Item):
-    def __init__(self, node):
-        Item.__init__(self, node)
-        for tag in ['image', 'layer']:
-            setattr(self, tag, self.get_element(tag, node))
+    tags = Item.tags + ['image', 'layer']
 
 class Enemy(Item):
-    def __init__(self, node):
-        Item.__init__(self, node)
-        for tag in ['pos_x', 'pos_y', 'behaviour', 'life', 'image', 'speed']:
-            setattr(self, tag, self.get_element(tag, node))
+    tags = Item.tags + ['pos_x', 'pos_y', 'behaviour', 'life', 'image',
+                        'speed']
+
+class Behav(Item):
+    tags = Item.tags + ['name', 'speed_x', 'speed_y', 'zigzag', 'seek']
+    # stages written before zigzag and seek don't have them
+    defaults = {'zigzag' : '0', 'seek' : '0'}
 
 class PU(Item):
-    def __init__(self, node):
-        Item.__init__(self, node)
-        for tag in ['pos_x', 'pos_y', 'speed_x', 'speed_y', 'time']:
-            setattr(self, tag, self.get_element(tag, node))
-        self.pu_attr = {}
+    tags = Item.tags + ['pos_x', 'pos_y', 'speed_x', 'speed_y', 'time']
+    pu_tags = []
 
 class Sw(PU):
-    def __init__(self, node):
-        PU.__init__(self, node)
-        for tag in ['name', 'ammo', 'max_ammo', 'cooldown', 'heating',
-                    'max_charge', 'distance']:
-            self.pu_attr[tag] = self.get_element(tag, node)
+    pu_tags = ['name', 'ammo', 'max_ammo', 'cooldown', 'heating',
+               'max_charge', 'distance']
 
 class Mult(Sw):
-    def __init__(self, node):
-        Sw.__init__(self, node)
-        for tag in ['radius', 'simultaneous_shoots']:
-            self.pu_attr[tag] = self.get_element(tag, node)
+    pu_tags = Sw.pu_tags + ['radius', 'simultaneous_shoots']
 
 class Frag(Sw):
-    def __init__(self, node):
-        Sw.__init__(self, node)
-        for tag in ['fragments']:
-            self.pu_attr[tag] = self.get_element(tag, node)
+    pu_tags = Sw.pu_tags + ['fragments']
 
 class FirstAidKit(PU):
-    def __init__(self, node):
-        PU.__init__(self, node)
-        for tag in ['life']:
-            self.pu_attr[tag] = self.get_element(tag, node)
+    pu_tags = ['life']
 
-class Stage:
-    L = list()
+# item class of each type
+ITEM_TYPES = {
+    "background" : Backg,
+    "enemy" : Enemy,
+    "behaviour" : Behav,
+    "sw_mult" : Mult,
+    "sw_frag" : Frag,
+    "sw_guided" : Sw,
+    "sw_elet" : Sw,
+    "first_aid_kit" : FirstAidKit,
+}
+
+def make_item(node):
+    """
+    Creates the item of an <item> element
+    """
+    values = dict((child.tag, (child.text or "").strip()) for child in node)
+    return ITEM_TYPES[values['type']](values)
+
+def compile_stage(source):
+    """
+    Parses the stage source file, returning a list with the frames where
+    something happens, in order, and a list with the items of each frame.
+    """
+    items = [make_item(node)
+             for node in ElementTree.parse(source).iter("item")]
+    # sort is stable, so items of the same frame keep the file order
+    items.sort(key=lambda item: item.cc)
+    frames = []
+    buckets = []
+    for item in items:
+        if not frames or frames[-1] != item.cc:
+            frames.append(item.cc)
+            buckets.append([])
+        buckets[-1].append(item)
+    return frames, buckets
+
+def load_compiled(source):
+    """
+    Returns the compiled timeline of source, from its cache if the source
+    didn't change, or compiling it and trying to save the cache.
+    """
+    f = open(source, 'rb')
+    try:
+        digest = hashlib.md5(f.read()).hexdigest()
+    finally:
+        f.close()
+    cache_file = source + CACHE_SUFFIX
+    try:
+        f = open(cache_file, 'rb')
+        try:
+            version, cached_digest, timeline = cPickle.load(f)
+        finally:
+            f.close()
+        if version == VERSION and cached_digest == digest:
+            return timeline
+    except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+        pass
+
+    timeline = compile_stage(source)
+    try:
+        f = open(cache_file, 'wb')
+        try:
+            cPickle.dump((VERSION, digest, timeline), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+    except IOError:
+        # the data dir may be read only, it will be compiled next time
+        pass
+    return timeline
 
+class Stage:
+    """
+    Timeline of the stage events. Items are compiled to a sorted list of
+    frames with the items of each one, and a cursor points to the next
+    frame, so each pop is constant time.
+    """
     def __init__(self, file):
-        self.data = xml.dom.minidom.parse(file)
+        self.file = file
+        self.frames = []
+        self.buckets = []
+        self.cursor = 0
 
-    def __cmp__(self, other):
-        return cmp(self.cc, other.cc)
+    def buildStage(self):
+        """
+        Loads the compiled timeline
+        """
+        self.frames, self.buckets = load_compiled(self.file)
+        self.cursor = 0
 
-    def getNextX(self):
-        if len(self.L) > 0:
-            item = self.L[len(self.L) - 1]
-            return item.cc
-        else:
-            return -1
+    def get_items(self):
+        """
+        Returns a list with all the items, in order
+        """
+        return [item for bucket in self.buckets for item in bucket]
 
-    def include(self, item):
-        self.L.append(item)
+    def getNextX(self):
+        """
+        Returns the frame of the next items, or -1 if the stage is over
+        """
+        if self.cursor < len(self.frames):
+            return self.frames[self.cursor]
+        return -1
 
     def pop(self, position):
-        subList = list()
-        nextx = int(self.getNextX())
-        while nextx == position:
-            subList.append(self.L.pop())
-            nextx = int(self.getNextX())
+        """
+        Returns the list of items up to frame position not popped yet
+        """
+        frames = self.frames
+        if self.cursor >= len(frames) or frames[self.cursor] > position:
+            return []
+        if frames[self.cursor] == position:
+            subList = self.buckets[self.cursor]
+            self.cursor += 1
+            return subList
+        # position jumped over some frames
+        end = bisect.bisect_right(frames, position, self.cursor)
+        subList = [item for bucket in self.buckets[self.cursor:end]
+                   for item in bucket]
+        self.cursor = end
         return subList
 
+
+class StreamingStage:
+    """
+    Timeline of the stage events read incrementally from the stage file,
+    for stages too long to be kept in memory. Only the items of the next
+    frames, up to window frames ahead of the current one, are kept.
+    Items are expected in frame order in the file, but disorder inside
+    the window is handled.
+    """
+    def __init__(self, file, window=STREAMING_WINDOW):
+        self.file = file
+        self.window = window
+        self.events = None
+        self.root = None
+        self.heap = []
+        self.count = 0
+        self.last_cc = -1
+
     def buildStage(self):
-        for node in self.data.getElementsByTagName("item"):
-            type = node.getElementsByTagName("type")[0].childNodes[0].nodeValue
-            if type == "background":
-                item = Backg(node)
-            elif type == "enemy":
-                item = Enemy(node)
-            elif type == "sw_mult":
-                item = Mult(node)
-            elif type == "sw_frag":
-                item = Frag(node)
-            elif type in ["sw_guided", "sw_elet"]:
-                item = Sw(node)
-            elif type == "first_aid_kit":
-                item = FirstAidKit(node)
-            self.include(item)
-        #below is some black magic I'm not sure how to deal with... but works
-        #taken from stackoverflow.org
-        self.L.sort(key=lambda item: int(item.cc), reverse=True)
+        """
+        Starts reading the file, loading the first window of items
+        """
+        self.events = ElementTree.iterparse(self.file, ("start", "end"))
+        self.heap = []
+        self.count = 0
+        self.last_cc = -1
+        self.fill(self.window)
+
+    def read(self):
+        """
+        Reads the next item from the file, returning None at the end of it
+        """
+        for event, elem in self.events:
+            if event == "start":
+                if self.root is None:
+                    self.root = elem
+                continue
+            if elem.tag != "item":
+                continue
+            item = make_item(elem)
+            # drop the parsed elements, so memory doesn't grow
+            self.root.clear()
+            return item
+        self.events = None
+        return None
+
+    def fill(self, position):
+        """
+        Reads items until one past position is found
+        """
+        while self.events is not None and self.last_cc <= position:
+            item = self.read()
+            if item is None:
+                return
+            self.last_cc = max(self.last_cc, item.cc)
+            heapq.heappush(self.heap, (item.cc, self.count, item))
+            self.count += 1
+
+    def get_items(self):
+        """
+        Returns a list with the items in memory, in order
+        """
+        return [entry[2] for entry in sorted(self.heap)]
+
+    def getNextX(self):
+        """
+        Returns the frame of the next items, or -1 if the stage is over
+        """
+        if self.heap:
+            return self.heap[0][0]
+        return -1
+
+    def pop(self, position):
+        """
+        Returns the list of items up to frame position not popped yet
+        """
+        self.fill(position + self.window)
+        heap = self.heap
+        subList = []
+        while heap and heap[0][0] <= position:
+            subList.append(heapq.heappop(heap)[2])
+        return subList
+
+def open_stage(file):
+    """
+    Returns the timeline of a stage file, streamed if the file is too big
+    to be compiled and kept in memory
+    """
+    if os.path.getsize(file) > STREAMING_SIZE:
+        return StreamingStage(file)
+    return Stage(file)
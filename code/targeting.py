@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import numpy
+
+# speed of guided bullets following a target
+GUIDED_SPEED = 10
+
+class Targeting:
+    """
+    Locks targets and steers all the guided bullets once per tick. Enemy
+    positions are indexed on a single array, so the bullets without a
+    target find the nearest one together, and the speeds of all the
+    bullets with a target are computed with a few vector operations.
+    Enemies already followed by a bullet are claimed, other bullets prefer
+    free ones, so a volley spreads over the wave.
+    Targets are kept as the enemy and its spawn generation, as enemies
+    killed come back from the pool, maybe on the same tick. A pooled enemy
+    spawned again is a new target.
+    """
+    def __init__(self, speed=GUIDED_SPEED):
+        self.speed = speed
+        self.enemies = []
+        self.keys = []
+        self.index = {}
+        self.positions = None
+
+    def build(self, enemies):
+        """
+        Indexes the positions of the live enemies of the group
+        """
+        self.enemies = enemies.sprites()
+        self.keys = [(enemy, enemy.generation) for enemy in self.enemies]
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        self.positions = numpy.array([enemy.rect.center
+                                      for enemy in self.enemies],
+                                     numpy.float64).reshape(-1, 2)
+
+    def lock(self, bullets):
+        """
+        Locks the nearest target for each bullet of the list, ignoring the
+        enemies each one has already followed
+        """
+        index = self.index
+        claimed = numpy.zeros(len(self.enemies), bool)
+        for bullet in bullets:
+            if bullet.target in index:
+                claimed[index[bullet.target]] = True
+        pending = [bullet for bullet in bullets
+                   if bullet.target not in index]
+        if not pending or not self.enemies:
+            for bullet in pending:
+                bullet.target = None
+            return
+
+        origin = numpy.array([bullet.rect.center for bullet in pending],
+                             numpy.float64)
+        # manhattan distance of each pending bullet to each enemy. It's a
+        # dense matrix instead of expanding rings on the collision grid:
+        # only bullets just fired or whose target died are pending, and the
+        # nearest free enemy may be across the screen, so the rings would
+        # often grow to the whole grid anyway. It costs about 1 ms for 100
+        # pending bullets on 100 enemies, growing with their product.
+        distances = numpy.abs(origin[:, numpy.newaxis, :] -
+                              self.positions[numpy.newaxis, :, :]).sum(2)
+        for row, bullet in zip(distances, pending):
+            # enemies killed are forgotten, if they come back from the pool
+            # they have another generation
+            bullet.prev_targets = set(key for key in bullet.prev_targets
+                                      if key in index)
+            for key in bullet.prev_targets:
+                row[index[key]] = numpy.inf
+            free = numpy.where(claimed, numpy.inf, row)
+            i = free.argmin()
+            if free[i] == numpy.inf:
+                # every enemy is claimed, the nearest one is shared
+                i = row.argmin()
+                if row[i] == numpy.inf:
+                    bullet.target = None
+                    continue
+            target = self.keys[i]
+            bullet.target = target
+            bullet.prev_targets.add(target)
+            claimed[i] = True
+
+    def steer(self, bullets):
+        """
+        Points the bullets with a target to it. Bullets without one keep
+        their speed.
+        """
+        locked = [bullet for bullet in bullets if bullet.target is not None]
+        if not locked:
+            return
+        index = self.index
+        origin = numpy.array([bullet.rect.center for bullet in locked],
+                             numpy.float64)
+        targets = self.positions[[index[bullet.target]
+                                  for bullet in locked]]
+        d = targets - origin
+        norm = numpy.hypot(d[:, 0], d[:, 1])
+        # a bullet on its target goes down, as it always did
+        over = norm == 0
+        d[over] = (0, 1)
+        norm[over] = 1
+        speeds = d * (self.speed / norm)[:, numpy.newaxis]
+        for bullet, speed in zip(locked, speeds.tolist()):
+            bullet.set_speed(speed)
+
+    def update(self, enemies, bullets):
+        """
+        Locks targets and steers the guided bullets of group bullets to the
+        sprites of group enemies
+        """
+        bullets = bullets.sprites()
+        if not bullets:
+            return
+        self.build(enemies)
+        self.lock(bullets)
+        self.steer(bullets)
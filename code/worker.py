@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+import ctypes
+import multiprocessing
+import Queue
+import numpy
+import pygame
+
+# fields at the start of each snapshot, before the elements
+HEADER = ["sequence", "counter", "count", "life", "xp", "run"]
+SEQUENCE, COUNTER, COUNT, LIFE, XP, RUN = range(len(HEADER))
+# each element is the index of its image on the image table and the
+# position of its top left corner
+FIELDS = 3
+# elements a snapshot holds, the others aren't drawn
+MAX_ELEMENTS = 8192
+SNAPSHOT_SIZE = len(HEADER) + MAX_ELEMENTS * FIELDS
+
+def get_elements(groups, index):
+    """
+    Returns an array with the image index and position of the elements of
+    groups, that may be sprite groups or BulletStores. index maps each
+    image to its position on the image table.
+    """
+    arrays = []
+    for group in groups:
+        if hasattr(group, "get_rects"):
+            n = len(group)
+            if not n:
+                continue
+            images = numpy.array([index[image] for image in group.images],
+                                 numpy.int32)
+            left, top, right, bottom = group.get_rects()
+            arrays.append(numpy.column_stack((images[group.image[:n]],
+                                              left, top)))
+        else:
+            sprites = group.sprites()
+            if sprites:
+                arrays.append(numpy.array([(index[sprite.image],
+                                            sprite.rect.left, sprite.rect.top)
+                                           for sprite in sprites],
+                                          numpy.int32).reshape(-1, FIELDS))
+    if not arrays:
+        return numpy.zeros((0, FIELDS), numpy.int32)
+    return numpy.concatenate(arrays).astype(numpy.int32)
+
+class SnapshotBuffer:
+    """
+    Double buffer of snapshots on shared memory. The simulation writes the
+    back one and flips, the renderer copies the front one. The flip and the
+    copy hold the same lock, so the back buffer is never being read.
+    """
+    warned = False
+
+    def __init__(self):
+        self.memory = multiprocessing.RawArray(ctypes.c_int32,
+                                               2 * SNAPSHOT_SIZE)
+        # buffer holding the last complete snapshot, -1 before the first
+        self.front = multiprocessing.Value(ctypes.c_int, -1)
+        self.sequence = 0
+        self.view = None
+
+    def get_view(self):
+        """
+        Returns a numpy array over the shared memory. It's created on the
+        process using it, after the worker is started.
+        """
+        if self.view is None:
+            self.view = numpy.frombuffer(self.memory, numpy.int32)
+        return self.view
+
+    def write(self, game, index):
+        """
+        Writes a snapshot of the game and makes it the front one. Only
+        the simulation writes, so reading which one is front needs no lock.
+        """
+        elements = get_elements(game.actors_list.values(), index)
+        count = len(elements)
+        if count > MAX_ELEMENTS:
+            if not self.warned:
+                print "Warning: more than %d elements, some not drawn" % \
+                    MAX_ELEMENTS
+                self.warned = True
+            count = MAX_ELEMENTS
+        back = 1 - max(self.front.value, 0)
+        start = back * SNAPSHOT_SIZE
+        view = self.get_view()
+        self.sequence += 1
+        view[start:start + len(HEADER)] = [self.sequence, game.counter,
+            count, game.player.get_life(), game.player.get_xp(),
+            int(game.run)]
+        view[start + len(HEADER):start + len(HEADER) + count * FIELDS] = \
+            elements[:count].ravel()
+        with self.front.get_lock():
+            self.front.value = back
+
+    def read(self):
+        """
+        Returns a copy of the last snapshot, as a header array and an
+        elements array, or None if there's none yet
+        """
+        view = self.get_view()
+        with self.front.get_lock():
+            front = self.front.value
+            if front == -1:
+                return None
+            start = front * SNAPSHOT_SIZE
+            count = view[start + COUNT]
+            end = start + len(HEADER) + count * FIELDS
+            snapshot = view[start:end].copy()
+        return (snapshot[:len(HEADER)],
+                snapshot[len(HEADER):].reshape(-1, FIELDS))
+
+def pack_events(events):
+    """
+    Returns events as tuples of type and attributes, that can be sent to
+    another process
+    """
+    return [(event.type, event.dict) for event in events]
+
+def unpack_events(packed):
+    """
+    Returns the events packed by pack_events
+    """
+    return [pygame.event.Event(type, attributes)
+            for type, attributes in packed]
+
+def run(buffer, inbox, preferences, cache_dir, seed):
+    """
+    Entry point of the simulation process. Runs a headless game on fixed
+    steps, with the input sent by the main process, writing a snapshot
+    after each step. Ends when None is received or the game ends.
+    """
+    # imported here, as the module is imported by the game
+    import game as game_module
+    game = game_module.Game(preferences, headless=True, cache_dir=cache_dir,
+                            seed=seed)
+    game.handles_interface = False
+    game.setup()
+    index = dict((image, i) for i, image in enumerate(game.get_image_table()))
+    clock = pygame.time.Clock()
+    step = game_module.STEP
+    buffer.write(game, index)
+    while game.run:
+        clock.tick(1000 / step)
+        events = []
+        try:
+            while True:
+                packed = inbox.get_nowait()
+                if packed is None:
+                    game.run = False
+                    break
+                events += unpack_events(packed)
+        except Queue.Empty:
+            pass
+        if not game.run:
+            break
+        game.profiler.begin(game.counter)
+        game.tick(step, step, events)
+        game.profiler.end()
+        game.counter += 1
+        if game.preferences.poll():
+            game.apply_preferences()
+        buffer.write(game, index)
+    buffer.write(game, index)
+
+class SimulationWorker:
+    """
+    Runs the simulation of a game on another process, so it takes its own
+    core and the main process only handles input and draws. The game state
+    comes back as snapshots on shared memory.
+    """
+    def __init__(self, preferences, cache_dir=None, seed=None):
+        self.buffer = SnapshotBuffer()
+        self.inbox = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=run,
+            args=(self.buffer, self.inbox, preferences, cache_dir, seed))
+        self.process.daemon = True
+
+    def start(self):
+        """
+        Starts the simulation process. It must be started before pygame is
+        initialized, so it doesn't inherit the display.
+        """
+        self.process.start()
+
+    def send(self, events):
+        """
+        Sends the events to the simulation
+        """
+        if events:
+            self.inbox.put(pack_events(events))
+
+    def read(self):
+        """
+        Returns the last snapshot, as SnapshotBuffer.read
+        """
+        return self.buffer.read()
+
+    def is_alive(self):
+        """
+        Returns True if the simulation is still running
+        """
+        return self.process.is_alive()
+
+    def stop(self):
+        """
+        Ends the simulation and waits for it
+        """
+        if self.process.is_alive():
+            self.inbox.put(None)
+            self.process.join()
@@ -18,6 +18,11 @@ import sys
 import os
 # imports parser for command line arguments in sys.argv
 import getopt
+# used to measure headless simulation throughput
+import time
+
+# ticks simulated when running headless without --ticks
+DEFAULT_TICKS = 3600
 
 def help_message():
     """
@@ -32,16 +37,34 @@ def usage():
     """
     prog = sys.argv[0]
     print "Usage:"
-    print "\t%s [-h|--help]" % prog
+    print "\t%s [-h|--help] [--headless] [-t|--ticks=N] " \
+          "[-p|--profile=FILE]" % prog
+    print "\t\t[-r|--record=FILE] [--replay=FILE] [-w|--worker]"
+    print
+    print "Options:"
+    print "\t--headless\tRun without display and audio devices"
+    print "\t-t, --ticks=N\tRun N simulation ticks as fast as possible " \
+          "and exit"
+    print "\t\t\t(default is %d on headless mode)" % DEFAULT_TICKS
+    print "\t-p, --profile=FILE\tSave frame timings to FILE on exit, as " \
+          "JSON if it"
+    print "\t\t\tends with .json or CSV otherwise"
+    print "\t-r, --record=FILE\tRecord the input of the game to FILE"
+    print "\t--replay=FILE\t\tPlay the game recorded on FILE again"
+    print "\t-w, --worker\tRun the simulation on another process"
     print
 
 def parse_opts(argv):
     """
-    Parses the command line argument
+    Parses the command line argument. Returns a dict with the options.
     """
+    options = {"headless" : False, "ticks" : None, "profile" : None,
+               "record" : None, "replay" : None, "worker" : False}
     # get options and arguments using getopt
     try:
-        opts, args = getopt.gnu_getopt(argv[1 :], "h", ["help"])
+        opts, args = getopt.gnu_getopt(argv[1 :], "ht:p:r:w",
+            ["help", "headless", "ticks=", "profile=", "record=", "replay=",
+             "worker"])
     except getopt.GetoptError:
         # if command line is wrong, print usage info and exit
         usage()
@@ -52,11 +75,52 @@ def parse_opts(argv):
             usage()
             help_message()
             sys.exit(0)
+        elif o == "--headless":
+            options["headless"] = True
+        elif o in ("-t", "--ticks"):
+            try:
+                options["ticks"] = int(a)
+            except ValueError:
+                usage()
+                sys.exit(2)
+        elif o in ("-p", "--profile"):
+            options["profile"] = os.path.abspath(a)
+        elif o in ("-r", "--record"):
+            options["record"] = os.path.abspath(a)
+        elif o == "--replay":
+            options["replay"] = os.path.abspath(a)
+        elif o in ("-w", "--worker"):
+            options["worker"] = True
+
+    # recordings are made and played by the main loop. Replays can run
+    # headless, to profile them without a display.
+    if options["record"] and (options["replay"] or options["headless"]):
+        print "Error: --record can't be used with --replay or --headless"
+        usage()
+        sys.exit(2)
+    if (options["record"] or options["replay"]) and options["ticks"]:
+        print "Error: --record and --replay can't be used with --ticks"
+        usage()
+        sys.exit(2)
+
+    # the simulation process takes its input from the window only
+    if options["worker"] and (options["headless"] or options["ticks"] or
+                              options["record"] or options["replay"]):
+        print "Error: --worker can't be used with other modes"
+        usage()
+        sys.exit(2)
+
+    if options["headless"] and options["ticks"] is None and \
+       not options["replay"]:
+        options["ticks"] = DEFAULT_TICKS
+    return options
 
 def main(argv):
     """
     Gets command line options and starts the game
     """
+    # paths given on command line are relative to the current directory
+    options = parse_opts(argv)
     # set directories and files
     abspath = os.path.abspath(argv[0])
     tmpdir = os.path.dirname(abspath)
@@ -73,19 +137,69 @@ def main(argv):
                 GAMEDIR = HOMEDIR
         PREFFILE = os.path.join(GAMEDIR, 'preferences.cfg')
     else:
+        GAMEDIR = DATADIR
         PREFFILE = os.path.join('data', 'preferences.cfg')
+    # generated data, that can be deleted at any time
+    CACHEDIR = os.path.join(GAMEDIR, 'cache')
+    if not os.path.isdir(CACHEDIR):
+        try:
+            os.mkdir(CACHEDIR, 0755)
+        except OSError:
+            CACHEDIR = None
     # change to the correct directory to find resources
     os.chdir(DATADIR)
     sys.path.insert(0, CODEDIR)
 
-    parse_opts(argv)
-
     from game import Game
     from preferences import Preferences
-    preferences = Preferences(PREFFILE, DEFPREFFILE)
-    game = Game(preferences)
-    # starts game's main loop
-    game.loop()
+    from replay import Recorder, Replay
+    from worker import SimulationWorker
+    PREFCACHE = None
+    if CACHEDIR:
+        PREFCACHE = os.path.join(CACHEDIR, 'preferences.cache')
+    preferences = Preferences(PREFFILE, DEFPREFFILE, PREFCACHE)
+    recorder = replay = seed = worker = None
+    if options["worker"]:
+        # started before the display is opened, which it doesn't share.
+        # It reads no cache, so both processes don't write the same files.
+        worker = SimulationWorker(preferences)
+        worker.start()
+    if options["replay"]:
+        try:
+            replay = Replay(options["replay"])
+        except (IOError, ValueError, EOFError), e:
+            print "Error: couldn't read recording: %s" % e
+            sys.exit(1)
+        # the same seed makes the game go the same way
+        seed = replay.seed
+    game = Game(preferences, headless=options["headless"],
+                cache_dir=CACHEDIR, seed=seed)
+    if options["record"]:
+        recorder = Recorder(options["record"], game.seed)
+    if worker:
+        try:
+            game.loop_worker(worker)
+        finally:
+            worker.stop()
+    elif options["ticks"] is None:
+        # starts game's main loop
+        try:
+            game.loop(recorder, replay)
+        finally:
+            if recorder:
+                recorder.close()
+            if replay:
+                replay.close()
+    else:
+        # runs a fixed number of ticks as fast as possible
+        start = time.time()
+        ticks = game.simulate(options["ticks"],
+                              render=not options["headless"])
+        elapsed = time.time() - start
+        print "%d ticks in %.3f s (%.1f ticks/s)" % \
+            (ticks, elapsed, ticks / max(elapsed, 1e-6))
+    if options["profile"]:
+        game.profiler.dump(options["profile"])
 
 
 # only executes code when a file is invoked as a script and not just imported
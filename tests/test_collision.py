@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#----------------------------------------------------------------------
+# Author:
+#   Bruno Dilly <bruno.dilly@brunodilly.org>
+#
+# Copyright (C) 2009 Bruno Dilly
+#
+# Released under GNU GPL, read the file 'COPYING' for more information
+# ----------------------------------------------------------------------
+
+"""
+Checks that the collision grid, and the hit checks of the game built on
+it, find the same pairs as the pygame spritecollide and groupcollide
+passes they replaced. Run from the top directory with:
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATADIR = os.path.join(ROOTDIR, 'data')
+DEFPREFFILE = os.path.join(DATADIR, 'default_preferences.cfg')
+sys.path.insert(0, os.path.join(ROOTDIR, 'code'))
+
+import numpy
+import pygame
+from collision import SpatialGrid, CELL_SIZE
+from shapes import collide
+
+SCREEN = (800, 600)
+# sizes of the sprites of each group, as the game images
+SIZES = {
+    "player" : (60, 60),
+    "enemies" : (40, 30),
+    "enemies_fire" : (8, 8),
+    "powerups" : (24, 24),
+    "fire" : (10, 4),
+}
+SEEDS = range(20)
+
+class Box(pygame.sprite.Sprite):
+    """
+    A sprite with a rect only, as the grid doesn't look at images. The
+    hit checks of the game also test its image, if given.
+    """
+    def __init__(self, rect, image=None):
+        pygame.sprite.Sprite.__init__(self)
+        self.rect = rect
+        self.image = image
+
+def make_group(rand, name, count):
+    """
+    Returns a group of count sprites of group name, placed randomly. Some
+    are partially out of the screen, as sprites entering or leaving it.
+    """
+    w, h = SIZES[name]
+    group = pygame.sprite.OrderedUpdates()
+    for i in range(count):
+        x = rand.randint(-w, SCREEN[0])
+        y = rand.randint(-h, SCREEN[1])
+        group.add(Box(pygame.Rect(x, y, w, h)))
+    return group
+
+class SpatialGridTest(unittest.TestCase):
+
+    def make_groups(self, seed):
+        """
+        Returns a dict of random groups, dense enough to have many hits
+        """
+        rand = random.Random(seed)
+        return {
+            "player" : make_group(rand, "player", 1),
+            "enemies" : make_group(rand, "enemies", rand.randint(0, 200)),
+            "enemies_fire" : make_group(rand, "enemies_fire",
+                                        rand.randint(0, 400)),
+            "powerups" : make_group(rand, "powerups", rand.randint(0, 20)),
+            "fire" : make_group(rand, "fire", rand.randint(0, 300)),
+        }
+
+    def check_sprite(self, groups, actor, name):
+        """
+        Compares the grid query of actor against spritecollide
+        """
+        grid = SpatialGrid()
+        grid.build({name : groups[name]})
+        expected = pygame.sprite.spritecollide(actor, groups[name], False)
+        self.assertEqual(grid.query(actor.rect, name), expected)
+
+    def test_player(self):
+        for seed in SEEDS:
+            groups = self.make_groups(seed)
+            player = groups["player"].sprites()[0]
+            for name in ["enemies_fire", "powerups", "enemies"]:
+                self.check_sprite(groups, player, name)
+
+    def test_player_everywhere(self):
+        # the player over every cell, so cell edges are crossed
+        groups = self.make_groups(0)
+        player = groups["player"].sprites()[0]
+        for x in range(-60, SCREEN[0], CELL_SIZE / 4):
+            for y in range(-60, SCREEN[1], CELL_SIZE / 4):
+                player.rect.topleft = (x, y)
+                for name in ["enemies_fire", "powerups", "enemies"]:
+                    self.check_sprite(groups, player, name)
+
+    def test_killed(self):
+        # sprites killed after the grid is built aren't found anymore
+        for seed in SEEDS:
+            groups = self.make_groups(seed)
+            grid = SpatialGrid()
+            grid.build({"enemies" : groups["enemies"]})
+            rand = random.Random(seed)
+            for enemy in groups["enemies"].sprites():
+                if rand.random() < 0.5:
+                    enemy.kill()
+            for o in groups["fire"].sprites():
+                expected = pygame.sprite.spritecollide(o, groups["enemies"],
+                                                       False)
+                self.assertEqual(grid.query(o.rect, "enemies"), expected)
+
+class GameHitTest(unittest.TestCase):
+    """
+    Runs Game.actor_check_hit on a headless game, against pygame passes
+    testing the same collision shapes once rects collide
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # the game loads its assets from the data dir
+        cls.cwd = os.getcwd()
+        os.chdir(DATADIR)
+        from game import Game
+        from preferences import Preferences
+        from stage import Stage
+        preferences = Preferences(DEFPREFFILE, DEFPREFFILE)
+        cls.game = Game(preferences, headless=True, seed=0)
+        cls.game.loaded_stage = Stage(None)
+        cls.game.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def fill(self, seed):
+        """
+        Places the player and random elements of every group, dense enough
+        to have many hits, and buckets them as Game.actors_act does
+        """
+        game = self.game
+        rand = random.Random(seed)
+        w, h = game.screen_size
+        actors = game.actors_list
+        for name in ["enemies", "guided_fire", "powerups"]:
+            for sprite in actors[name].sprites():
+                sprite.kill()
+        for name in ["enemies_fire", "fire"]:
+            actors[name].kill(numpy.arange(len(actors[name])))
+        game.player.set_pos([rand.randint(0, w), rand.randint(0, h)])
+        for i in range(rand.randint(0, 200)):
+            enemy = game.pools["enemies"].acquire([0, 0], 0, 1, "normal", 0,
+                                                  game.image_enemy)
+            enemy.set_pos([rand.randint(0, w), rand.randint(0, h)])
+            game.add_enemy(enemy)
+        for i in range(rand.randint(0, 20)):
+            powerup = game.pools["powerups"].acquire([0, 0], 3000, [0, 0],
+                "first_aid_kit", {"life" : "1"},
+                game.image_powerup["first_aid_kit"])
+            powerup.set_pos([rand.randint(0, w), rand.randint(0, h)])
+            actors["powerups"].add(powerup)
+        for i in range(rand.randint(0, 100)):
+            rot = rand.randint(0, 359)
+            game.pools["guided_bullets"].acquire(
+                [rand.randint(0, w), rand.randint(0, h)], [0, 0],
+                rotation=rot, image=game.image_player_fire["sw_guided"],
+                list=actors["guided_fire"])
+        for name, image in [("enemies_fire", game.image_enemy_fire),
+                            ("fire", game.image_player_fire["fire"])]:
+            for i in range(rand.randint(0, 400)):
+                actors[name].spawn([rand.randint(0, w), rand.randint(0, h)],
+                                   [rand.choice([-1, 1]), 0], image)
+        game.grid.build({"enemies" : actors["enemies"],
+                         "powerups" : actors["powerups"]})
+
+    def get_collided(self, name_a, name_b):
+        """
+        Returns a collided callback of pygame, testing the shapes of
+        groups name_a and name_b once rects collide
+        """
+        shape_a = self.game.shapes[name_a]
+        shape_b = self.game.shapes[name_b]
+        return lambda a, b: a.rect.colliderect(b.rect) and \
+            collide(shape_a, a.rect, a.image, shape_b, b.rect, b.image)
+
+    def get_bullets(self, name):
+        """
+        Returns the bullets of the store name as sprites, in order
+        """
+        store = self.game.actors_list[name]
+        return [Box(store.get_rect(i), store.get_image(i))
+                for i in range(len(store))]
+
+    def test_player(self):
+        game = self.game
+        player = game.player
+        for seed in SEEDS:
+            for name in ["powerups", "enemies"]:
+                self.fill(seed)
+                group = game.actors_list[name]
+                expected = pygame.sprite.spritecollide(player, group, False,
+                    self.get_collided("player", name))
+                hitted = []
+                game.actor_check_hit(player, name,
+                                     lambda *args: hitted.append(args) or True)
+                self.assertEqual(len(hitted), len(expected))
+                for sprite in expected:
+                    self.assertFalse(sprite.alive())
+
+    def test_player_bullets(self):
+        game = self.game
+        player = game.player
+        for seed in SEEDS:
+            self.fill(seed)
+            store = game.actors_list["enemies_fire"]
+            bullets = self.get_bullets("enemies_fire")
+            expected = pygame.sprite.spritecollide(player, bullets, False,
+                self.get_collided("player", "enemies_fire"))
+            hitted = []
+            game.actor_check_hit(player, "enemies_fire",
+                                 lambda: hitted.append(True))
+            self.assertEqual(len(hitted), len(expected))
+            self.assertEqual(len(store), len(bullets) - len(expected))
+
+    def test_fire(self):
+        game = self.game
+        for seed in SEEDS:
+            self.fill(seed)
+            bullets = self.get_bullets("fire")
+            expected = pygame.sprite.groupcollide(bullets,
+                game.actors_list["enemies"], False, False,
+                self.get_collided("fire", "enemies"))
+            expected = dict((bullets.index(bullet), enemies)
+                            for bullet, enemies in expected.items())
+            hitted = game.actor_check_hit(game.actors_list["fire"],
+                                          "enemies", lambda enemy: None,
+                                          "fire")
+            self.assertEqual(hitted, expected)
+
+    def test_guided_fire(self):
+        game = self.game
+        for seed in SEEDS:
+            self.fill(seed)
+            group = game.actors_list["guided_fire"]
+            expected = pygame.sprite.groupcollide(group,
+                game.actors_list["enemies"], False, False,
+                self.get_collided("guided_fire", "enemies"))
+            hitted = game.actor_check_hit(group, "enemies",
+                                          lambda enemy: None, "guided_fire")
+            self.assertEqual(hitted, expected)
+
+if __name__ == '__main__':
+    unittest.main()